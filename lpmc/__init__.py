@@ -0,0 +1,3 @@
+"""
+Shared helpers for the LPMC mode choice models.
+"""
@@ -0,0 +1,261 @@
+"""
+Benchmarks of estimation and simulation.
+
+The LPMC sample is replicated 10, 100 or 1000 times and each model is
+estimated with the numpy engines and with biogeme for several numbers of
+threads; the market share simulation of ``Model 5.py`` (base case and the
+two pricing scenarios of model3) is timed the same way. Every case runs
+in a fresh forked process, so that its peak resident memory is its own.
+
+For each case the wall time, number of iterations and likelihood
+evaluations, final log likelihood and peak RSS are written to a JSON file,
+together with a description of the machine. Given the file of an earlier
+run, the cases that became slower are reported and the exit status is 1.
+
+Run ``python -m lpmc.benchmark --scales 1 10 --output benchmark.json`` from
+the root of the repository.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from lpmc.specs import SPECS
+from lpmc.warmstart import ROOT, read_iter_file
+
+ENGINES = ('numpy', 'biogeme')
+TASKS = ('estimate', 'simulate')
+
+# scenarios of Model 5.py
+SIMULATION_MODEL = 'model3'
+SIMULATION_SCENARIOS = [('PT', {'cost_transit': 0.85}), ('car', {'cost_driving': 1.15})]
+
+# columns identifying a case
+KEY = ['task', 'model', 'engine', 'scale', 'threads']
+
+
+def replicate(df, scale):
+    """``scale`` copies of the rows of ``df``."""
+    if scale == 1:
+        return df
+    return df.iloc[np.tile(np.arange(len(df)), scale)].reset_index(drop=True)
+
+
+def machine():
+    """Description of the machine and of the software versions."""
+    info = {
+        'host': platform.node(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+    }
+    try:
+        import biogeme.version
+        info['biogeme'] = biogeme.version.getVersion()
+    except ImportError:
+        info['biogeme'] = None
+    try:
+        info['commit'] = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True,
+                                        text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        info['commit'] = None
+    return info
+
+
+def _simulation_betas():
+    path = os.path.join(ROOT, SIMULATION_MODEL, f'__{SIMULATION_MODEL}.iter')
+    if os.path.exists(path):
+        return read_iter_file(path)
+    from lpmc.data import load_data
+    from lpmc.engine import model_for
+    return model_for(SPECS[SIMULATION_MODEL], load_data()).estimate(covariance=False).get_beta_values()
+
+
+def _estimate_numpy(spec, df, threads):
+    from lpmc.engine import model_for
+
+    model = model_for(spec, df)
+    setup = time.perf_counter()
+    res = model.estimate(covariance=False)
+    return setup, {'loglike': res.loglike, 'iterations': res.iterations, 'evaluations': res.evaluations}
+
+
+def _estimate_biogeme(spec, df, threads):
+    from lpmc.expressions import biogeme_model
+
+    biogeme = biogeme_model(spec, df, threads=threads)
+    setup = time.perf_counter()
+    results = biogeme.estimate()
+    messages = getattr(results.data, 'optimizationMessages', None) or {}
+    return setup, {
+        'loglike': results.data.logLike,
+        'iterations': messages.get('Number of iterations'),
+        'evaluations': messages.get('Number of function evaluations'),
+    }
+
+
+def _scenarios():
+    from lpmc.scenarios import Scenario
+    return [Scenario(name, transforms) for name, transforms in SIMULATION_SCENARIOS]
+
+
+def _simulate_numpy(spec, df, threads, betas):
+    from lpmc.scenarios import simulate
+
+    setup = time.perf_counter()
+    shares = simulate(spec, df, betas, _scenarios())
+    return setup, {'shares': shares.to_dict(orient='index')}
+
+
+def _simulate_biogeme(spec, df, threads, betas):
+    from lpmc.expressions import biogeme_model, probabilities
+
+    formulas = {f'Prob. {alt}': P for alt, P in probabilities(spec).items()}
+    biogeme = biogeme_model(spec, df, formulas, threads=threads)
+    setup = time.perf_counter()
+    shares = {'base': biogeme.simulate(betas).mean().to_dict()}
+    for scenario in _scenarios():
+        changed = df.assign(**{col: scenario.apply(df, col) for col in scenario.transforms})
+        biogeme = biogeme_model(spec, changed, formulas, threads=threads)
+        shares[scenario.name] = biogeme.simulate(betas).mean().to_dict()
+    return setup, {'shares': shares}
+
+
+RUNNERS = {
+    ('estimate', 'numpy'): _estimate_numpy,
+    ('estimate', 'biogeme'): _estimate_biogeme,
+    ('simulate', 'numpy'): _simulate_numpy,
+    ('simulate', 'biogeme'): _simulate_biogeme,
+}
+
+
+def run_case(task, model, engine, scale, threads, betas=None):
+    """Run one case in the current process and return its record."""
+    from lpmc.data import load_data
+
+    spec = SPECS[model]
+    start = time.perf_counter()
+    df = replicate(load_data(), scale)
+    loaded = time.perf_counter()
+    args = (spec, df, threads) if betas is None else (spec, df, threads, betas)
+    setup, result = RUNNERS[task, engine](*args)
+    end = time.perf_counter()
+    record = dict(zip(KEY, (task, model, engine, scale, threads)))
+    record.update(
+        n_obs=len(df),
+        load_seconds=loaded - start,
+        setup_seconds=setup - loaded,
+        seconds=end - setup,
+        # kilobytes on Linux
+        peak_rss_mb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    )
+    record.update(result)
+    return record
+
+
+def cases(tasks, models, engines, scales, threads):
+    """(task, model, engine, scale, threads) of every case, the numpy engines first."""
+    for task in tasks:
+        names = models if task == 'estimate' else [SIMULATION_MODEL]
+        for engine in engines:
+            for scale in scales:
+                for name in names:
+                    for n in (threads if engine == 'biogeme' else [1]):
+                        yield task, name, engine, scale, n
+
+
+def run(tasks=TASKS, models=tuple(SPECS), engines=ENGINES, scales=(1, 10, 100, 1000),
+        threads=(1, 2, 4, 8), verbose=True):
+    """Run all the cases, each in its own forked process, and return their records."""
+    context = multiprocessing.get_context('fork')
+    betas = _simulation_betas() if 'simulate' in tasks else None
+    records = []
+    for case in cases(tasks, models, engines, scales, threads):
+        case_betas = betas if case[0] == 'simulate' else None
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            try:
+                record = pool.submit(run_case, *case, case_betas).result()
+            except Exception as e:
+                record = dict(zip(KEY, case), error=f'{type(e).__name__}: {e}')
+        records.append(record)
+        if verbose:
+            status = record.get('error') or f"{record['seconds']:.2f} s, {record['peak_rss_mb']:.0f} MB"
+            print(' '.join(str(c) for c in case), status, file=sys.stderr, flush=True)
+    return records
+
+
+def summary(records):
+    """Table of the cases, with the speedup of biogeme over its single-threaded run."""
+    table = pd.DataFrame(records)
+    if 'seconds' not in table:
+        return table.set_index(KEY)
+    single = table[table['threads'] == 1].set_index(['task', 'model', 'engine', 'scale'])['seconds']
+    keys = pd.MultiIndex.from_frame(table[['task', 'model', 'engine', 'scale']])
+    table['speedup'] = single.reindex(keys).to_numpy() / table['seconds']
+    columns = ['n_obs', 'seconds', 'speedup', 'iterations', 'evaluations', 'loglike', 'peak_rss_mb']
+    return table.set_index(KEY)[[c for c in columns if c in table]]
+
+
+def save(records, path):
+    with open(path, 'w') as f:
+        json.dump({'machine': machine(), 'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                   'results': records}, f, indent=1, default=str)
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def regressions(baseline, records, tolerance=0.2):
+    """Cases slower than in ``baseline`` (a saved run) by more than ``tolerance``."""
+    before = pd.DataFrame(baseline['results'])
+    after = pd.DataFrame(records)
+    if 'seconds' not in before or 'seconds' not in after:
+        return pd.DataFrame()
+    both = before.dropna(subset=['seconds']).merge(after.dropna(subset=['seconds']), on=KEY,
+                                                   suffixes=('_before', '_after'))
+    both['ratio'] = both['seconds_after'] / both['seconds_before']
+    slower = both[both['ratio'] > 1 + tolerance]
+    return slower.set_index(KEY)[['seconds_before', 'seconds_after', 'ratio']]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark estimation and simulation.')
+    parser.add_argument('--tasks', nargs='+', choices=TASKS, default=list(TASKS))
+    parser.add_argument('--models', nargs='+', choices=list(SPECS), default=list(SPECS),
+                        help='specifications to estimate')
+    parser.add_argument('--engines', nargs='+', choices=ENGINES, default=list(ENGINES))
+    parser.add_argument('--scales', nargs='+', type=int, default=[1, 10, 100, 1000],
+                        help='number of copies of the sample')
+    parser.add_argument('--threads', nargs='+', type=int, default=[1, 2, 4, 8],
+                        help='values of numberOfThreads for biogeme')
+    parser.add_argument('--output', default='benchmark.json', help='JSON file of the results')
+    parser.add_argument('--baseline', default=None, help='JSON file of an earlier run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='relative slowdown reported')
+    args = parser.parse_args()
+
+    records = run(args.tasks, args.models, args.engines, args.scales, args.threads)
+    save(records, args.output)
+    pd.set_option('display.width', 200)
+    pd.set_option('display.max_columns', None)
+    print(summary(records))
+    if args.baseline is not None:
+        slower = regressions(load(args.baseline), records, args.tolerance)
+        if len(slower):
+            print('\nSlower than the baseline:')
+            print(slower)
+            sys.exit(1)
@@ -0,0 +1,151 @@
+"""
+Bootstrap of the parameter estimates.
+
+The resamples are drawn up front as one weight vector per replication
+(integer counts for the classical bootstrap, Dirichlet weights for the
+Bayesian bootstrap) and stored in a memory-mapped file. Replications are
+estimated in a process pool, each one starting from the full sample
+estimates, and written to disk as soon as they finish, so an interrupted
+run resumes where it stopped.
+
+The estimator is any function ``estimate(weights, start) -> {name: value}``;
+``mnl_estimator`` and ``biogeme_estimator`` build one.
+"""
+
+import csv
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+METHODS = ('resample', 'bayesian')
+
+# estimator of the current run, inherited by the forked workers
+_ESTIMATOR = None
+_WEIGHTS = None
+
+
+def draw_weights(n_obs, n_reps, method='resample', seed=0, path=None):
+    """Weights of each observation in each replication, shape (n_reps, n_obs).
+
+    Replication r only depends on (seed, r), so adding replications keeps the
+    earlier ones unchanged. With ``path`` the array is a memory-mapped file.
+    """
+    if method not in METHODS:
+        raise ValueError(f'Unknown bootstrap method {method}, use one of {METHODS}')
+    dtype = np.uint16 if method == 'resample' else np.float32
+    if path is None:
+        weights = np.empty((n_reps, n_obs), dtype=dtype)
+    else:
+        weights = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=(n_reps, n_obs))
+    for r in range(n_reps):
+        rng = np.random.default_rng([seed, r])
+        if method == 'resample':
+            weights[r] = np.bincount(rng.integers(0, n_obs, n_obs), minlength=n_obs)
+        else:
+            weights[r] = n_obs * rng.dirichlet(np.ones(n_obs))
+    if path is not None:
+        weights.flush()
+    return weights
+
+
+def _run_one(r, start):
+    return r, _ESTIMATOR(np.asarray(_WEIGHTS[r], dtype=float), start)
+
+
+def _load_done(path):
+    done = {}
+    if os.path.exists(path):
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                r = int(row.pop('replication'))
+                done[r] = {name: float(value) for name, value in row.items()}
+    return done
+
+
+def bootstrap(estimator, n_obs, n_reps, start, directory, method='resample', seed=0, workers=None):
+    """Bootstrap estimates, as a list of {name: value} (one per replication).
+
+    ``start`` holds the full sample estimates. The draws and the finished
+    replications are kept in ``directory``; calling the function again with
+    the same arguments only estimates the missing replications.
+    """
+    global _ESTIMATOR, _WEIGHTS
+    os.makedirs(directory, exist_ok=True)
+    config = {'n_obs': n_obs, 'n_reps': n_reps, 'method': method, 'seed': seed}
+    config_path = os.path.join(directory, 'bootstrap.json')
+    weights_path = os.path.join(directory, 'weights.npy')
+    results_path = os.path.join(directory, 'replications.csv')
+
+    previous = None
+    if os.path.exists(config_path):
+        with open(config_path) as f:
+            previous = json.load(f)
+    same_draws = previous is not None and all(previous[k] == config[k] for k in ('n_obs', 'method', 'seed'))
+    if not same_draws and os.path.exists(results_path):
+        os.remove(results_path)
+    if previous != config or not os.path.exists(weights_path):
+        draw_weights(n_obs, n_reps, method, seed, weights_path)
+        with open(config_path, 'w') as f:
+            json.dump(config, f)
+
+    done = {r: values for r, values in _load_done(results_path).items() if r < n_reps}
+    todo = [r for r in range(n_reps) if r not in done]
+    names = list(start)
+
+    _ESTIMATOR = estimator
+    _WEIGHTS = np.load(weights_path, mmap_mode='r')
+    write_header = not os.path.exists(results_path)
+    context = multiprocessing.get_context('fork')
+    with open(results_path, 'a', newline='') as f, \
+            ProcessPoolExecutor(max_workers=workers or os.cpu_count(), mp_context=context) as pool:
+        writer = csv.writer(f)
+        if write_header:
+            writer.writerow(['replication'] + names)
+        futures = [pool.submit(_run_one, r, start) for r in todo]
+        for future in as_completed(futures):
+            r, values = future.result()
+            done[r] = values
+            writer.writerow([r] + [values[name] for name in names])
+            f.flush()
+    return [done[r] for r in range(n_reps)]
+
+
+def mnl_estimator(model):
+    """Estimator re-using the data already compiled in a ``lpmc.mnl`` model."""
+    def estimate(weights, start):
+        model.weights = weights
+        return model.estimate(start, covariance=False).get_beta_values()
+    return estimate
+
+
+def biogeme_estimator(df, logprob, name='bootstrap'):
+    """Estimator for a biogeme log likelihood expression.
+
+    The database is built once; each replication only overwrites its
+    BOOTSTRAP_WEIGHT column with the counts, 0 for the observations that
+    are not drawn, so no resampled copy of the data is built.
+    """
+    database = None
+
+    def estimate(weights, start):
+        nonlocal database
+        import biogeme.biogeme as bio
+        import biogeme.database as db
+        from biogeme.expressions import Variable
+
+        if database is None:
+            # built in the worker, after the fork, with its own weight column
+            database = db.Database(name, df.assign(BOOTSTRAP_WEIGHT=0.0))
+        database.data['BOOTSTRAP_WEIGHT'] = weights
+        formulas = {'loglike': logprob, 'weight': Variable('BOOTSTRAP_WEIGHT')}
+        biogeme = bio.BIOGEME(database, formulas, numberOfThreads=1)
+        biogeme.modelName = name
+        biogeme.generateHtml = False
+        biogeme.generatePickle = False
+        biogeme.saveIterations = False
+        biogeme.changeInitValues(start)
+        return biogeme.estimate().getBetaValues()
+    return estimate
@@ -0,0 +1,115 @@
+"""
+Logit models with Box-Cox transformed attributes.
+
+The transform (x**l - 1) / l is evaluated as (exp(l * log x) - 1) / l, with
+log x computed once per column. Its derivative with respect to l is
+(l * x**l * log x - x**l + 1) / l**2. The transformed columns and their
+derivatives are kept in an LRU cache keyed by the value of l: the line
+searches and finite differences of the optimizer keep coming back to the
+same values of l while only the other coefficients change.
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+
+from lpmc.mnl import LogitModel, design_tensor
+from lpmc.specs import Spec
+
+# below this |l| the transform is replaced by its expansion around l = 0
+SMALL_LAMBDA = 1e-5
+
+
+class BoxCoxColumns:
+    """Box-Cox transforms of some columns, cached by value of lambda."""
+
+    def __init__(self, columns, cache_size=32):
+        self.log_x = {}
+        self.positive = {}
+        for name, x in columns.items():
+            x = np.asarray(x, dtype=float)
+            self.positive[name] = x > 0
+            self.log_x[name] = np.log(np.where(x > 0, x, 1.0))
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _compute(self, ell):
+        transformed = {}
+        for name, log_x in self.log_x.items():
+            if abs(ell) < SMALL_LAMBDA:
+                y = log_x + ell * log_x ** 2 / 2
+                dy = log_x ** 2 / 2
+            else:
+                x_ell = np.exp(ell * log_x)
+                y = (x_ell - 1) / ell
+                dy = (ell * x_ell * log_x - x_ell + 1) / ell ** 2
+            # biogeme sets the transform of 0 to 0
+            positive = self.positive[name]
+            transformed[name] = (np.where(positive, y, 0.0), np.where(positive, dy, 0.0))
+        return transformed
+
+    def get(self, ell):
+        """{column: (transform, derivative wrt lambda)} for this value of lambda."""
+        key = float(ell)
+        if key in self.cache:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        self.misses += 1
+        value = self.cache[key] = self._compute(key)
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return value
+
+
+class BoxCoxMNL(LogitModel):
+    """Multinomial logit whose utilities may contain Box-Cox terms.
+
+    The terms without transform go into a design tensor, as in ``MNL``; the
+    Box-Cox terms are added on top with their derivatives with respect to
+    both their coefficient and lambda.
+    """
+
+    def __init__(self, spec, df, weights=None, cache_size=32):
+        super().__init__(spec, df, weights)
+        index = {name: k for k, name in enumerate(self.beta_names)}
+        linear = Spec(spec.name, {alt: [t for t in terms if not isinstance(t.boxcox, str)]
+                                  for alt, terms in spec.utilities.items()})
+        self.X = design_tensor(linear, df, self.beta_names)
+        self.lambdas = sorted({t.boxcox for terms in spec.utilities.values()
+                               for t in terms if isinstance(t.boxcox, str)})
+        # (alternative, coefficient, lambda, column, segment mask) of each Box-Cox term
+        self.terms = []
+        columns = {}
+        for j, alt in enumerate(self.alternatives):
+            for term in spec.utilities[alt]:
+                if not isinstance(term.boxcox, str):
+                    continue
+                mask = None
+                if term.segment is not None:
+                    by, value = term.segment
+                    mask = df[by].to_numpy() == value
+                self.terms.append((j, index[term.beta], index[term.boxcox], term.column, mask))
+                columns.setdefault(term.boxcox, {})[term.column] = df[term.column]
+        self.columns = {name: BoxCoxColumns(cols, cache_size) for name, cols in columns.items()}
+
+    def start_values(self, start=None):
+        # biogeme models start lambda at 1, the untransformed attribute
+        start = {**{name: 1.0 for name in self.lambdas}, **(start or {})}
+        return super().start_values(start)
+
+    def utilities(self, beta):
+        dV = self.X.copy()
+        V = self.X @ beta
+        transformed = {name: self.columns[name].get(beta[self.beta_names.index(name)])
+                       for name in self.lambdas}
+        for j, k, l, column, mask in self.terms:
+            y, dy = transformed[self.beta_names[l]][column]
+            if mask is not None:
+                y, dy = y * mask, dy * mask
+            V[:, j] += beta[k] * y
+            dV[:, j, k] += y
+            dV[:, j, l] += beta[k] * dy
+        return V, dV
@@ -0,0 +1,59 @@
+"""
+Compression of the estimation sample into unique observations.
+
+A specification only reads the columns of ``Spec.columns()``. Rows that
+agree on all of them contribute the same log probability and scores, so
+they are collapsed into one row whose weight is the sum of their weights
+(their count without weights). The weighted log likelihood, gradient,
+BHHH matrix and Hessian are unchanged, and the estimates report the
+original number of observations, so AIC and BIC are unchanged as well.
+
+Mixed logit specs are not compressed: each observation has its own draws.
+
+Run ``python -m lpmc.compress`` from the root of the repository to see how
+much each specification compresses the LPMC data.
+"""
+
+import numpy as np
+
+
+def compress(spec, df, weights=None):
+    """Unique rows of ``df`` projected on the columns of ``spec``, and their weights."""
+    if spec.random:
+        raise ValueError(f'{spec.name} has random coefficients, its observations cannot be merged')
+    columns = spec.columns()
+    values = df[columns].to_numpy(dtype=float)
+    _, first, inverse = np.unique(values, axis=0, return_index=True, return_inverse=True)
+    weights = np.ones(len(df)) if weights is None else np.asarray(weights, dtype=float)
+    frequencies = np.bincount(inverse.ravel(), weights=weights, minlength=len(first))
+    return df[columns].iloc[first].reset_index(drop=True), frequencies
+
+
+def compressed_model(spec, df, weights=None):
+    """Likelihood of ``spec`` on the unique rows of ``df``, weighted by their frequency."""
+    from lpmc.engine import model_for
+
+    unique, frequencies = compress(spec, df, weights)
+    model = model_for(spec, unique, frequencies)
+    model.sample_size = len(df)
+    return model
+
+
+if __name__ == '__main__':
+    import time
+
+    from lpmc.data import load_data
+    from lpmc.engine import model_for
+    from lpmc.specs import SPECS
+
+    df = load_data()
+    for name, spec in SPECS.items():
+        start = time.perf_counter()
+        model = compressed_model(spec, df)
+        results = model.estimate(covariance=False)
+        seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        full = model_for(spec, df).estimate(covariance=False)
+        full_seconds = time.perf_counter() - start
+        print(f'{name}: {len(df)} -> {model.n_obs} rows ({model.n_obs / len(df):.1%}), '
+              f'LL {results.loglike:.3f} in {seconds:.2f} s (full sample: {full.loglike:.3f} in {full_seconds:.2f} s)')
@@ -0,0 +1,260 @@
+"""
+Shared loader for the LPMC data.
+
+The tab-separated file is parsed once into a columnar binary cache: one raw
+file per column with an explicit dtype, plus a small ``meta.json``. Later
+loads memory-map the columns instead of parsing the text again. The cache is
+rebuilt whenever the hash of the source file changes. The derived columns
+registered in ``lpmc.features`` are materialized in the cache as well.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from lpmc.features import DERIVED, add_derived
+from lpmc.profiling import span
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+DATA_PATH = os.path.join(DATA_DIR, 'lpmc01.dat')
+
+# rows parsed per chunk when building the cache
+CHUNK_SIZE = 1_000_000
+
+# explicit storage types of the LPMC columns (see data_description.pdf)
+DTYPES = {
+    'trip_id': 'int32',
+    'household_id': 'int32',
+    'person_n': 'int8',
+    'trip_n': 'int8',
+    'travel_mode': 'int8',
+    'purpose': 'int8',
+    'fueltype': 'int8',
+    'faretype': 'int8',
+    'bus_scale': 'float32',
+    'survey_year': 'int8',
+    'travel_year': 'int16',
+    'travel_month': 'int8',
+    'travel_date': 'int8',
+    'day_of_week': 'int8',
+    'start_time': 'float32',
+    'age': 'int8',
+    'female': 'int8',
+    'driving_license': 'int8',
+    'car_ownership': 'int8',
+    'distance': 'int32',
+    'dur_walking': 'float32',
+    'dur_cycling': 'float32',
+    'dur_pt_access': 'float32',
+    'dur_pt_rail': 'float32',
+    'dur_pt_bus': 'float32',
+    'dur_pt_int': 'float32',
+    'pt_interchanges': 'int8',
+    'dur_driving': 'float32',
+    'cost_transit': 'float32',
+    'cost_driving_fuel': 'float32',
+    'cost_driving_ccharge': 'float32',
+    'driving_traffic_percent': 'float32',
+}
+
+
+def file_hash(path, block_size=1 << 20):
+    """SHA-256 of a file, read in blocks."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def cache_path(path=DATA_PATH):
+    """Directory holding the binary cache of a data file."""
+    return os.path.splitext(path)[0] + '.cache'
+
+
+class CacheWriter:
+    """Appends DataFrame chunks to a columnar cache directory.
+
+    Columns are written as raw binary files, so the number of rows does not
+    need to be known in advance. The cache only becomes visible once
+    ``close`` has written ``meta.json`` and moved the directory in place.
+    """
+
+    def __init__(self, directory, dtypes=None, source=None):
+        self.directory = directory
+        self.tmp = directory + '.tmp'
+        self.dtypes = dict(DTYPES if dtypes is None else dtypes)
+        self.source = source or {}
+        self.columns = None
+        self.n_rows = 0
+        shutil.rmtree(self.tmp, ignore_errors=True)
+        os.makedirs(self.tmp)
+
+    def append(self, chunk):
+        if self.columns is None:
+            self.columns = list(chunk.columns)
+            for col in self.columns:
+                self.dtypes.setdefault(col, chunk[col].dtype.str)
+        for col in self.columns:
+            values = np.ascontiguousarray(chunk[col].to_numpy(dtype=self.dtypes[col]))
+            with open(os.path.join(self.tmp, f'{col}.bin'), 'ab') as f:
+                f.write(values.tobytes())
+        self.n_rows += len(chunk)
+
+    def close(self):
+        meta = {
+            'n_rows': self.n_rows,
+            'columns': self.columns or [],
+            'dtypes': {col: np.dtype(self.dtypes[col]).str for col in self.columns or []},
+            'derived': {},
+            'source': self.source,
+        }
+        with open(os.path.join(self.tmp, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent=1)
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.replace(self.tmp, self.directory)
+        return meta
+
+
+def _source_info(path, sha256=None):
+    st = os.stat(path)
+    return {
+        'path': os.path.abspath(path),
+        'size': st.st_size,
+        'mtime_ns': st.st_mtime_ns,
+        'sha256': sha256 or file_hash(path),
+    }
+
+
+def read_meta(path=DATA_PATH):
+    """Metadata of the cache of ``path``, or None if there is no cache."""
+    meta_file = os.path.join(cache_path(path), 'meta.json')
+    if not os.path.exists(meta_file):
+        return None
+    with open(meta_file) as f:
+        return json.load(f)
+
+
+def _is_fresh(path, meta):
+    """Whether the cache still matches the source file.
+
+    The file is only hashed again if its size or modification time changed.
+    """
+    if meta is None:
+        return False
+    source = meta['source']
+    if 'sha256' not in source:
+        # generated data (see lpmc.synthetic): there is no file to go stale
+        return True
+    st = os.stat(path)
+    if st.st_size == source['size'] and st.st_mtime_ns == source['mtime_ns']:
+        return True
+    if file_hash(path) != source['sha256']:
+        return False
+    # same content, new timestamp: remember it to skip hashing next time
+    source['mtime_ns'] = st.st_mtime_ns
+    with open(os.path.join(cache_path(path), 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=1)
+    return True
+
+
+def build_cache(path=DATA_PATH, chunk_size=CHUNK_SIZE):
+    """Parse the tab-separated file chunk by chunk into the binary cache."""
+    source = _source_info(path)
+    writer = CacheWriter(cache_path(path), source=source)
+    for chunk in pd.read_csv(path, sep='\t', dtype=DTYPES, chunksize=chunk_size):
+        writer.append(chunk)
+    return writer.close()
+
+
+def _materialize_derived(path, meta, chunk_size=CHUNK_SIZE):
+    """Add to the cache the derived columns that are missing or outdated."""
+    todo = [name for name, spec in DERIVED.items()
+            if meta.get('derived', {}).get(name) != spec.version
+            and all(col in meta['columns'] for col in spec.inputs)]
+    if not todo:
+        return meta
+    directory = cache_path(path)
+    inputs = sorted({col for name in todo for col in DERIVED[name].inputs})
+    arrays = _memmaps(directory, meta, inputs)
+    files = {name: open(os.path.join(directory, f'{name}.bin'), 'wb') for name in todo}
+    try:
+        for start in range(0, meta['n_rows'], chunk_size):
+            chunk = pd.DataFrame({col: np.array(arrays[col][start:start + chunk_size]) for col in inputs})
+            add_derived(chunk, todo)
+            for name in todo:
+                files[name].write(np.ascontiguousarray(chunk[name]).tobytes())
+    finally:
+        for f in files.values():
+            f.close()
+    meta.setdefault('derived', {})
+    for name in todo:
+        if name not in meta['columns']:
+            meta['columns'].append(name)
+        meta['dtypes'][name] = np.dtype(DERIVED[name].dtype).str
+        meta['derived'][name] = DERIVED[name].version
+    with open(os.path.join(directory, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=1)
+    return meta
+
+
+def ensure_cache(path=DATA_PATH):
+    """Build the cache of ``path`` if it is missing or stale, return its metadata."""
+    meta = read_meta(path)
+    if not _is_fresh(path, meta):
+        meta = build_cache(path)
+    return _materialize_derived(path, meta)
+
+
+def _memmaps(directory, meta, columns):
+    arrays = {}
+    for col in columns:
+        if meta['n_rows'] == 0:
+            arrays[col] = np.empty(0, dtype=meta['dtypes'][col])
+            continue
+        arrays[col] = np.memmap(
+            os.path.join(directory, f'{col}.bin'),
+            dtype=meta['dtypes'][col],
+            mode='r',
+            shape=(meta['n_rows'],),
+        )
+    return arrays
+
+
+def open_columns(path=DATA_PATH, columns=None):
+    """Memory-mapped, read-only arrays of the cached columns."""
+    meta = ensure_cache(path)
+    columns = meta['columns'] if columns is None else columns
+    return _memmaps(cache_path(path), meta, columns)
+
+
+def load_data(path=DATA_PATH, columns=None, use_cache=True):
+    """Load the LPMC data as a DataFrame.
+
+    With ``use_cache`` the columns come from the binary cache (built on the
+    first call); otherwise the text file is parsed directly. Either way the
+    derived columns of ``lpmc.features`` are included.
+    """
+    with span('load data'):
+        if not use_cache:
+            df = add_derived(pd.read_csv(path, sep='\t', dtype=DTYPES))
+            return df if columns is None else df[columns]
+        arrays = open_columns(path, columns)
+        return pd.DataFrame({col: np.array(values) for col, values in arrays.items()})
+
+
+def iter_chunks(path=DATA_PATH, columns=None, chunk_size=CHUNK_SIZE):
+    """DataFrames of at most ``chunk_size`` consecutive rows of the cached data.
+
+    Only the rows of the current chunk are read from the memory-mapped
+    columns, so memory stays bounded whatever the size of the file.
+    """
+    arrays = open_columns(path, columns)
+    n_rows = len(next(iter(arrays.values()))) if arrays else 0
+    for start in range(0, n_rows, chunk_size):
+        stop = min(start + chunk_size, n_rows)
+        yield pd.DataFrame({col: np.array(values[start:stop]) for col, values in arrays.items()})
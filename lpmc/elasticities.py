@@ -0,0 +1,66 @@
+"""
+Closed-form elasticities and values of time for logit models.
+
+For a multinomial logit the derivative of P_i with respect to an attribute
+x of alternative k is dV_k/dx * P_i * (delta_ik - P_k), so the point
+elasticity is dV_k/dx * x * (delta_ik - P_k). Everything is computed from
+the probability matrix in vectorized form, without symbolic derivatives.
+"""
+
+import numpy as np
+import pandas as pd
+
+from lpmc.mnl import logsumexp
+from lpmc.specs import ALTERNATIVES
+
+
+def probabilities(spec, data, betas):
+    """Choice probabilities, shape (rows, alternatives)."""
+    V = spec.utility_matrix(data, betas)
+    return np.exp(V - logsumexp(V)[:, None])
+
+
+def point_elasticities(spec, data, betas, column, P=None):
+    """Elasticity of each probability with respect to ``column``, shape (rows, alternatives).
+
+    ``column`` may enter the utility of several alternatives; the effects
+    are summed.
+    """
+    if spec.nests:
+        raise ValueError(f'The closed-form elasticities assume a multinomial logit, {spec.name} is nested')
+    P = probabilities(spec, data, betas) if P is None else P
+    alts = sorted(spec.utilities)
+    x = np.asarray(data[column], dtype=float)
+    E = np.zeros_like(P)
+    for k, alt in enumerate(alts):
+        dV = spec.marginal_utility(alt, column, data, betas)
+        if not dV.any():
+            continue
+        E -= (dV * x * P[:, k])[:, None]
+        E[:, k] += dV * x
+    return E
+
+
+def elasticity_matrix(spec, data, betas, attributes, weights=None, P=None):
+    """Aggregate elasticities, one row per attribute and one column per alternative.
+
+    ``attributes`` maps a row label to a column, e.g. ``{'PT': 'cost_transit'}``.
+    Point elasticities are aggregated with the weighted probabilities:
+    E_i = sum_n w_n P_ni E_ni / sum_n w_n P_ni. The diagonal entries are the
+    direct elasticities, the others the cross elasticities.
+    """
+    P = probabilities(spec, data, betas) if P is None else P
+    w = np.ones(len(P)) if weights is None else np.asarray(weights, dtype=float)
+    wP = w[:, None] * P
+    rows = {}
+    for label, column in attributes.items():
+        E = point_elasticities(spec, data, betas, column, P)
+        rows[label] = (wP * E).sum(axis=0) / wP.sum(axis=0)
+    columns = [ALTERNATIVES[alt] for alt in sorted(spec.utilities)]
+    return pd.DataFrame.from_dict(rows, orient='index', columns=columns)
+
+
+def value_of_time(spec, data, betas, alt, time_column, cost_column):
+    """Value of time of ``alt`` for each row: (dV/d time) / (dV/d cost)."""
+    return (spec.marginal_utility(alt, time_column, data, betas)
+            / spec.marginal_utility(alt, cost_column, data, betas))
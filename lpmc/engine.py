@@ -0,0 +1,39 @@
+"""
+Choice of the likelihood engine for a specification.
+"""
+
+import numpy as np
+
+from lpmc.boxcox import BoxCoxMNL
+from lpmc.mnl import MNL, logsumexp
+
+
+def model_class(spec):
+    """Fastest engine able to evaluate ``spec``."""
+    if spec.random:
+        from lpmc.mixed import MixedLogit
+        return MixedLogit
+    if spec.nests:
+        from lpmc.nested import NestedLogit
+        return NestedLogit
+    return MNL if spec.is_linear() else BoxCoxMNL
+
+
+def choice_probabilities(spec, V, betas):
+    """Probabilities of the alternatives given their utilities V (observations x alternatives)."""
+    if spec.nests:
+        from lpmc.nested import nested_probabilities
+        return nested_probabilities(spec, V, betas)
+    return np.exp(V - logsumexp(V)[:, None])
+
+
+def model_for(spec, df, weights=None, compress=False):
+    """Likelihood of ``spec`` on the data ``df``.
+
+    With ``compress`` the identical observations are merged first (see
+    ``lpmc.compress``); the likelihood is the same.
+    """
+    if compress:
+        from lpmc.compress import compressed_model
+        return compressed_model(spec, df, weights)
+    return model_class(spec)(spec, df, weights)
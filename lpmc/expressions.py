@@ -0,0 +1,133 @@
+"""
+Biogeme expressions of the specifications in ``lpmc.specs``.
+
+A Spec is translated term by term into the expressions the model scripts
+write by hand, so that biogeme and the numpy engines estimate the same
+model. biogeme is only imported when an expression is built.
+"""
+
+from lpmc.specs import CHOICE
+
+
+def parameters(spec):
+    """Beta expressions of the parameters of ``spec``, by name.
+
+    Box-Cox parameters and nest scales start at 1, the others at 0, like in
+    the model scripts.
+    """
+    from biogeme.expressions import Beta
+
+    ones = {term.boxcox for terms in spec.utilities.values() for term in terms if isinstance(term.boxcox, str)}
+    ones |= {scale for scale, _ in spec.nests or () if isinstance(scale, str)}
+    bounds = spec.bounds or {}
+    return {
+        name: Beta(name, 1.0 if name in ones else 0.0, *bounds.get(name, (None, None)), 0)
+        for name in spec.beta_names()
+    }
+
+
+def utilities(spec, betas=None):
+    """Utility expression of each alternative."""
+    from biogeme import models
+    from biogeme.expressions import Numeric, Variable
+
+    betas = parameters(spec) if betas is None else betas
+    V = {}
+    for alt, terms in sorted(spec.utilities.items()):
+        v = Numeric(0)
+        for term in terms:
+            if term.column is None:
+                v = v + betas[term.beta]
+                continue
+            x = Variable(term.column)
+            if term.boxcox is not None:
+                ell = betas[term.boxcox] if isinstance(term.boxcox, str) else term.boxcox
+                x = models.boxcox(x, ell)
+            if term.segment is not None:
+                by, value = term.segment
+                x = x * (Variable(by) == value)
+            v = v + betas[term.beta] * x
+        V[alt] = v
+    return V
+
+
+def _nests(spec, betas):
+    cross = any(isinstance(alts, dict) for _, alts in spec.nests)
+    nests = []
+    for scale, alts in spec.nests:
+        mu = betas[scale] if isinstance(scale, str) else scale
+        if cross and not isinstance(alts, dict):
+            alts = {alt: 1.0 for alt in alts}
+        nests.append((mu, alts))
+    return tuple(nests), cross
+
+
+def availabilities(spec, alternatives):
+    """Availability expression of each alternative, from the bitmask column of the spec.
+
+    Bit ``alt - 1`` of the mask is extracted with comparisons only, by
+    removing the higher bits one at a time.
+    """
+    from biogeme.expressions import Variable
+
+    if spec.availability is None:
+        return {alt: 1 for alt in alternatives}
+    mask = Variable(spec.availability)
+    high = max(alternatives)
+    av = {}
+    for alt in alternatives:
+        rest = mask
+        for bit in range(high - 1, alt - 1, -1):
+            rest = rest - 2 ** bit * (rest >= 2 ** bit)
+        av[alt] = rest >= 2 ** (alt - 1)
+    return av
+
+
+def loglike(spec, betas=None):
+    """Log of the probability of the chosen alternative."""
+    from biogeme import models
+    from biogeme.expressions import Variable
+
+    betas = parameters(spec) if betas is None else betas
+    V = utilities(spec, betas)
+    av = availabilities(spec, V)
+    choice = Variable(CHOICE)
+    if not spec.nests:
+        return models.loglogit(V, av, choice)
+    nests, cross = _nests(spec, betas)
+    if cross:
+        return models.logcnl_avail(V, av, nests, choice)
+    return models.lognested(V, av, nests, choice)
+
+
+def probabilities(spec, betas=None):
+    """Probability expression of each alternative, for ``BIOGEME.simulate``."""
+    from biogeme import models
+
+    betas = parameters(spec) if betas is None else betas
+    V = utilities(spec, betas)
+    av = availabilities(spec, V)
+    if not spec.nests:
+        return {alt: models.logit(V, av, alt) for alt in V}
+    nests, cross = _nests(spec, betas)
+    if cross:
+        return {alt: models.cnl_avail(V, av, nests, alt) for alt in V}
+    return {alt: models.nested(V, av, nests, alt) for alt in V}
+
+
+def biogeme_model(spec, df, formulas=None, name=None, threads=1):
+    """BIOGEME object for ``spec`` on ``df`` that writes no output files.
+
+    ``formulas`` defaults to the log likelihood of the spec.
+    """
+    import biogeme.biogeme as bio
+    import biogeme.database as db
+
+    name = spec.name if name is None else name
+    formulas = loglike(spec) if formulas is None else formulas
+    biogeme = bio.BIOGEME(db.Database(name, df), formulas, numberOfThreads=threads)
+    biogeme.modelName = name
+    biogeme.generateHtml = False
+    biogeme.generatePickle = False
+    biogeme.saveIterations = False
+    return biogeme
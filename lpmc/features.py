@@ -0,0 +1,113 @@
+"""
+Derived attributes shared by all the models.
+
+Each derived column is registered once, with its dtype and the columns it
+is computed from. The data cache materializes the registered columns next
+to the raw ones, so the models refer to them by name (``Variable('dur_pt')``)
+instead of rebuilding the arithmetic in every likelihood evaluation. Bump
+the version of a definition to have the caches recompute it.
+"""
+
+from typing import Callable, NamedTuple, Tuple
+
+import numpy as np
+
+
+class Derived(NamedTuple):
+    compute: Callable
+    dtype: str
+    inputs: Tuple[str, ...]
+    version: int = 1
+
+
+DERIVED = {}
+
+# upper bounds of the age groups (0-16, 16-30, 30-60, 60+), as in pd.cut
+AGE_BINS = [0, 16, 30, 60, 1000]
+
+
+def derived(name, dtype, inputs, version=1):
+    """Register the decorated function as the definition of column ``name``."""
+    def register(compute):
+        DERIVED[name] = Derived(compute, dtype, tuple(inputs), version)
+        return compute
+    return register
+
+
+@derived('cost_driving', 'float32', ['cost_driving_fuel', 'cost_driving_ccharge'])
+def cost_driving(df):
+    return df['cost_driving_fuel'] + df['cost_driving_ccharge']
+
+
+@derived('dur_pt', 'float32', ['dur_pt_access', 'dur_pt_rail', 'dur_pt_bus', 'dur_pt_int'])
+def dur_pt(df):
+    return df['dur_pt_access'] + df['dur_pt_rail'] + df['dur_pt_bus'] + df['dur_pt_int']
+
+
+@derived('age_group', 'int8', ['age'])
+def age_group(df):
+    """0 to 3 for the intervals (0, 16], (16, 30], (30, 60], (60, 1000], -1 outside."""
+    age = np.asarray(df['age'])
+    group = np.searchsorted(AGE_BINS, age, side='left') - 1
+    return np.where((age > AGE_BINS[0]) & (age <= AGE_BINS[-1]), group, -1)
+
+
+# alternatives by bit of the availability masks
+ROUTES = {
+    1: ('dur_walking',),
+    2: ('dur_cycling',),
+    3: ('dur_pt_rail', 'dur_pt_bus'),
+    4: ('dur_driving',),
+}
+
+
+def _bitmask(rules):
+    mask = np.zeros(len(next(iter(rules.values()))), dtype=np.uint8)
+    for alt, available in rules.items():
+        mask |= available.astype(np.uint8) << (alt - 1)
+    return mask
+
+
+def _routes(df):
+    return {alt: np.sum([np.asarray(df[col]) for col in columns], axis=0) > 0 for alt, columns in ROUTES.items()}
+
+
+@derived('availability', 'uint8', [col for columns in ROUTES.values() for col in columns], version=2)
+def availability(df):
+    """Bitmask of the available alternatives: bit ``alt - 1`` is set when ``alt`` is available.
+
+    An alternative is available when it has a route: a positive walking,
+    cycling or driving duration, and a rail or bus leg for public
+    transport (7 trips of the LPMC data only have an access walk). Car
+    passengers count as car trips in the LPMC data, so driving does not
+    require a licence here; see ``availability_driver``.
+    """
+    return _bitmask(_routes(df))
+
+
+@derived('availability_driver', 'uint8', [col for columns in ROUTES.values() for col in columns]
+         + ['driving_license', 'car_ownership'])
+def availability_driver(df):
+    """Like ``availability``, driving also needs a licence or a car in the household.
+
+    For data where car passengers are a separate alternative: 85 trips of
+    the LPMC data chosen by car fail this rule.
+    """
+    rules = _routes(df)
+    rules[4] = rules[4] & ((np.asarray(df['driving_license']) > 0) | (np.asarray(df['car_ownership']) > 0))
+    return _bitmask(rules)
+
+
+def available_alternatives(mask, alternatives):
+    """Boolean array (observations x alternatives) from an availability bitmask."""
+    bits = np.asarray(alternatives) - 1
+    return (np.asarray(mask, dtype=np.int64)[:, None] >> bits[None, :]) & 1 > 0
+
+
+def add_derived(df, names=None):
+    """Add the registered columns missing from ``df`` (in place) and return it."""
+    for name in DERIVED if names is None else names:
+        if name not in df:
+            spec = DERIVED[name]
+            df[name] = np.asarray(spec.compute(df)).astype(spec.dtype)
+    return df
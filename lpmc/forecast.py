@@ -0,0 +1,102 @@
+"""
+Sample enumeration forecasts as a streaming reduction.
+
+The probabilities of each chunk of observations are reduced right away to
+weighted sums per alternative, overall and per segment, so the forecast of
+a sample of any size never holds more than one chunk of probabilities.
+
+Run ``python -m lpmc.forecast model3 --betas model3/__model3.iter --segment age_group``
+from the root of the repository.
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from lpmc.data import CHUNK_SIZE, DATA_PATH, iter_chunks
+from lpmc.engine import choice_probabilities
+from lpmc.specs import ALTERNATIVES, SPECS
+
+
+class Forecast:
+    """Weighted sums of the choice probabilities, overall and per segment."""
+
+    def __init__(self, spec, segments=()):
+        self.spec = spec
+        self.segments = list(segments)
+        self.names = [ALTERNATIVES[alt] for alt in sorted(spec.utilities)]
+        self.totals = np.zeros(len(self.names))
+        self.weight = 0.0
+        self.n_obs = 0
+        self.segment_totals = {}
+        self.segment_weights = {}
+
+    def add(self, P, w, keys=None):
+        """Accumulate probabilities P (rows x alternatives) with weights w."""
+        self.totals += w @ P
+        self.weight += w.sum()
+        self.n_obs += len(w)
+        if keys is None:
+            return
+        codes, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        sums = np.zeros((len(codes), P.shape[1]))
+        np.add.at(sums, inverse, w[:, None] * P)
+        weights = np.bincount(inverse, weights=w, minlength=len(codes))
+        for code, total, weight in zip(map(tuple, codes), sums, weights):
+            if code in self.segment_totals:
+                self.segment_totals[code] += total
+                self.segment_weights[code] += weight
+            else:
+                self.segment_totals[code] = total
+                self.segment_weights[code] = weight
+
+    @property
+    def shares(self):
+        """Weighted market shares of the alternatives."""
+        return pd.Series(self.totals / self.weight, index=self.names)
+
+    @property
+    def segment_shares(self):
+        """Weighted market shares within each segment, one row per segment."""
+        keys = sorted(self.segment_totals)
+        rows = [self.segment_totals[k] / self.segment_weights[k] for k in keys]
+        index = pd.MultiIndex.from_tuples(keys, names=self.segments)
+        return pd.DataFrame(rows, index=index, columns=self.names)
+
+
+def forecast(spec, betas, chunks, weight=None, segments=()):
+    """Forecast of ``spec`` with parameters ``betas`` over the DataFrames in ``chunks``.
+
+    ``weight`` names the column of sample weights (all 1 if None) and
+    ``segments`` the columns defining the segments.
+    """
+    if isinstance(chunks, pd.DataFrame):
+        chunks = [chunks]
+    result = Forecast(spec, segments)
+    for chunk in chunks:
+        P = choice_probabilities(spec, spec.utility_matrix(chunk, betas), betas)
+        w = np.ones(len(chunk)) if weight is None else chunk[weight].to_numpy(dtype=float)
+        keys = chunk[list(segments)].to_numpy() if segments else None
+        result.add(P, w, keys)
+    return result
+
+
+if __name__ == '__main__':
+    from lpmc.warmstart import read_iter_file
+
+    parser = argparse.ArgumentParser(description='Forecast market shares by sample enumeration.')
+    parser.add_argument('model', help='name of the specification')
+    parser.add_argument('--betas', required=True, help='biogeme .iter file with the parameters')
+    parser.add_argument('--segment', action='append', default=[], help='column defining segments')
+    parser.add_argument('--weight', default=None, help='column of sample weights')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='rows per chunk')
+    parser.add_argument('--data', default=DATA_PATH, help='tab-separated data file')
+    args = parser.parse_args()
+
+    chunks = iter_chunks(args.data, chunk_size=args.chunk_size)
+    result = forecast(SPECS[args.model], read_iter_file(args.betas), chunks, args.weight, args.segment)
+    print(result.shares)
+    if args.segment:
+        print(result.segment_shares)
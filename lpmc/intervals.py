@@ -0,0 +1,221 @@
+"""
+Confidence intervals of forecasts from the covariance of the estimates.
+
+Instead of re-estimating the model on bootstrap samples, the uncertainty
+of the estimates is taken from their (robust) covariance matrix Sigma:
+
+* delta method: a statistic g(beta) has variance J Sigma J', with J its
+  Jacobian at the estimates. For the weighted market shares of a logit,
+  S_i = sum_n w_n P_ni / sum_n w_n, the Jacobian is analytic:
+  dS_i/dbeta = sum_n w_n P_ni (dV_ni/dbeta - sum_j P_nj dV_nj/dbeta) / sum_n w_n,
+  with dV/dbeta from the numpy engine (Box-Cox lambdas included). Nested
+  shares, aggregate elasticities and values of time use central
+  differences.
+* parametric simulation: beta is drawn from N(beta_hat, Sigma) and the
+  statistic evaluated for every draw. For utilities linear in the
+  parameters, the utilities of all the draws are one product of the design
+  tensor with the matrix of draws.
+
+Run ``python -m lpmc.intervals model3`` from the root of the repository to
+compare the two on the stored estimates of a model.
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from lpmc.elasticities import elasticity_matrix, value_of_time
+from lpmc.engine import choice_probabilities, model_for
+from lpmc.features import available_alternatives
+from lpmc.mnl import design_tensor, logsumexp
+from lpmc.specs import ALTERNATIVES
+
+# draws of the parameters evaluated together in the simulation
+DRAWS_PER_BATCH = 250
+
+
+def covariance_frame(run, robust=True):
+    """Covariance matrix of a stored run (``lpmc.store.Run``), indexed by parameter."""
+    cov = run.robust_covariance if robust else run.covariance
+    if cov is None:
+        raise ValueError(f'Run {run.id} of {run.model} has no covariance matrix')
+    return pd.DataFrame(cov, index=run.names, columns=run.names)
+
+
+def _weights(n, weights):
+    w = np.ones(n) if weights is None else np.asarray(weights, dtype=float)
+    return w / w.sum()
+
+
+def _interval_table(values, std_err, index, level):
+    z = stats.norm.ppf(0.5 + level / 2)
+    return pd.DataFrame({'Value': values, 'Std err': std_err,
+                         'Lower': values - z * std_err, 'Upper': values + z * std_err}, index=index)
+
+
+def numerical_jacobian(function, beta, step=1e-6):
+    """Central differences of a vector-valued ``function`` of the parameters."""
+    beta = np.asarray(beta, dtype=float)
+    columns = []
+    for k in range(len(beta)):
+        h = step * max(1.0, abs(beta[k]))
+        up, down = beta.copy(), beta.copy()
+        up[k] += h
+        down[k] -= h
+        columns.append((np.asarray(function(up)) - np.asarray(function(down))) / (2 * h))
+    return np.column_stack(columns)
+
+
+def delta_method(function, betas, covariance, index=None, level=0.9, jacobian=None):
+    """Delta method intervals of the vector-valued ``function(betas)``.
+
+    ``betas`` maps names to values and ``covariance`` is a DataFrame indexed
+    by the same names; ``function`` takes a dict like ``betas``. Without an
+    analytic ``jacobian`` (statistics x parameters, in the order of
+    ``covariance``), it is computed by central differences.
+    """
+    names = list(covariance.index)
+    beta = np.array([betas[name] for name in names])
+
+    def at(values):
+        return function(dict(betas, **dict(zip(names, values))))
+
+    values = np.asarray(at(beta), dtype=float)
+    J = numerical_jacobian(at, beta) if jacobian is None else jacobian
+    std_err = np.sqrt(np.einsum('ik,kl,il->i', J, covariance.to_numpy(), J))
+    return _interval_table(values, std_err, index, level)
+
+
+def share_jacobian(spec, data, betas, names, weights=None):
+    """Weighted market shares and their analytic Jacobian (alternatives x ``names``)."""
+    if spec.nests or spec.random:
+        raise ValueError(f'The analytic Jacobian assumes a multinomial logit, not {spec.name}')
+    model = model_for(spec, data)
+    beta = np.array([betas[name] for name in model.beta_names])
+    V, dV = model.utilities(beta)
+    V = model.available_utilities(V)
+    P = np.exp(V - logsumexp(V)[:, None])
+    w = _weights(len(P), weights)
+    dV_bar = np.einsum('nj,njk->nk', P, dV)
+    J = np.einsum('n,nj,njk->jk', w, P, dV - dV_bar[:, None, :])
+    columns = [model.beta_names.index(name) for name in names]
+    return w @ P, J[:, columns]
+
+
+def share_intervals(spec, data, betas, covariance, weights=None, level=0.9):
+    """Delta method intervals of the weighted market shares."""
+    index = [ALTERNATIVES[alt] for alt in sorted(spec.utilities)]
+    w = _weights(len(data), weights)
+
+    def shares(b):
+        return w @ choice_probabilities(spec, spec.utility_matrix(data, b), b)
+
+    jacobian = None
+    if not spec.nests:
+        _, jacobian = share_jacobian(spec, data, betas, list(covariance.index), weights)
+    return delta_method(shares, betas, covariance, index, level, jacobian)
+
+
+def elasticity_intervals(spec, data, betas, covariance, attributes, weights=None, level=0.9):
+    """Delta method intervals of the aggregate elasticities (rows attribute/alternative)."""
+    labels = [ALTERNATIVES[alt] for alt in sorted(spec.utilities)]
+    index = [f'{attribute}/{label}' for attribute in attributes for label in labels]
+
+    def elasticities(b):
+        return elasticity_matrix(spec, data, b, attributes, weights).to_numpy().ravel()
+
+    return delta_method(elasticities, betas, covariance, index, level)
+
+
+def vot_intervals(spec, data, betas, covariance, times, weights=None, level=0.9):
+    """Delta method intervals of the weighted mean values of time.
+
+    ``times`` maps a label to (alternative, time column, cost column).
+    """
+    w = _weights(len(data), weights)
+
+    def vot(b):
+        return [w @ value_of_time(spec, data, b, *columns) for columns in times.values()]
+
+    return delta_method(vot, betas, covariance, list(times), level)
+
+
+def draw_parameters(betas, covariance, n_draws, seed=0):
+    """Draws from N(beta_hat, Sigma), as a DataFrame draws x parameters."""
+    names = list(covariance.index)
+    rng = np.random.default_rng(seed)
+    mean = np.array([betas[name] for name in names])
+    draws = rng.multivariate_normal(mean, covariance.to_numpy(), size=n_draws, method='eigh')
+    return pd.DataFrame(draws, columns=names)
+
+
+def simulate_shares(spec, data, betas, covariance, n_draws=1000, weights=None, seed=0):
+    """Weighted market shares for draws of the parameters, shape (draws, alternatives)."""
+    draws = draw_parameters(betas, covariance, n_draws, seed)
+    w = _weights(len(data), weights)
+    if spec.is_linear() and not spec.nests:
+        names = spec.beta_names()
+        B = np.tile([betas[name] for name in names], (n_draws, 1))
+        for name in draws.columns:
+            B[:, names.index(name)] = draws[name]
+        X = design_tensor(spec, data, names)
+        n, J, K = X.shape
+        X = X.reshape(n * J, K)
+        available = None
+        if spec.availability is not None:
+            available = available_alternatives(data[spec.availability], sorted(spec.utilities))[:, :, None]
+        shares = np.empty((n_draws, J))
+        for start in range(0, n_draws, DRAWS_PER_BATCH):
+            # utilities of a batch of draws, shape (rows, alternatives, draws)
+            V = (X @ B[start:start + DRAWS_PER_BATCH].T).reshape(n, J, -1)
+            if available is not None:
+                V = np.where(available, V, -np.inf)
+            P = np.exp(V - logsumexp(V, axis=1)[:, None, :])
+            shares[start:start + DRAWS_PER_BATCH] = np.einsum('n,njr->rj', w, P)
+        return shares
+    rows = []
+    for _, draw in draws.iterrows():
+        b = dict(betas, **draw.to_dict())
+        rows.append(w @ choice_probabilities(spec, spec.utility_matrix(data, b), b))
+    return np.array(rows)
+
+
+def simulation_intervals(spec, data, betas, covariance, n_draws=1000, weights=None, level=0.9, seed=0):
+    """Percentile intervals of the weighted market shares over draws of the parameters."""
+    shares = simulate_shares(spec, data, betas, covariance, n_draws, weights, seed)
+    lower, upper = np.quantile(shares, [0.5 - level / 2, 0.5 + level / 2], axis=0)
+    return pd.DataFrame({'Mean': shares.mean(axis=0), 'Std err': shares.std(axis=0, ddof=1),
+                         'Lower': lower, 'Upper': upper},
+                        index=[ALTERNATIVES[alt] for alt in sorted(spec.utilities)])
+
+
+if __name__ == '__main__':
+    import time
+
+    from lpmc import memo
+    from lpmc.data import load_data
+    from lpmc.specs import SPECS
+
+    parser = argparse.ArgumentParser(description='Confidence intervals of the market shares of a model.')
+    parser.add_argument('model', choices=list(SPECS))
+    parser.add_argument('--draws', type=int, default=2000, help='draws of the parameters')
+    parser.add_argument('--level', type=float, default=0.9)
+    args = parser.parse_args()
+
+    spec = SPECS[args.model]
+    df = load_data()
+    run = memo.estimate(spec, df)
+    betas, covariance = run.get_beta_values(), covariance_frame(run)
+    start = time.perf_counter()
+    print(share_intervals(spec, df, betas, covariance, level=args.level))
+    print(f'Delta method: {time.perf_counter() - start:.2f} s')
+    start = time.perf_counter()
+    print(simulation_intervals(spec, df, betas, covariance, args.draws, level=args.level))
+    print(f'Simulation ({args.draws} draws): {time.perf_counter() - start:.2f} s')
+    if not spec.nests:
+        attributes = {'PT cost': 'cost_transit', 'car cost': 'cost_driving'}
+        print(elasticity_intervals(spec, df, betas, covariance, attributes, level=args.level))
+    times = {'PT': (3, 'dur_pt', 'cost_transit'), 'CAR': (4, 'dur_driving', 'cost_driving')}
+    print(vot_intervals(spec, df, betas, covariance, times, level=args.level))
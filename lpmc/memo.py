@@ -0,0 +1,103 @@
+"""
+Memoized estimation.
+
+An estimation is identified by the specification, the version of the data
+and the optimizer settings (engine included). If the result store
+(``lpmc.store``) already holds a run with the same three hashes, its
+estimates and covariance matrices are returned; otherwise the model is
+estimated once and recorded, so forecasting jobs only estimate when
+something changed.
+
+Run ``python -m lpmc.memo model3`` from the root of the repository to get
+the estimates of model3, estimating it only if needed.
+"""
+
+import argparse
+import hashlib
+import json
+import time
+
+from lpmc.data import DATA_PATH, load_data
+from lpmc.specs import SPECS
+from lpmc.store import ResultStore, data_hash, spec_hash
+
+ENGINES = ('numpy', 'biogeme')
+
+
+def settings_hash(engine, settings=None):
+    """Hash of the engine and of its optimizer settings (functions by name)."""
+    content = {'engine': engine, 'settings': settings or {}}
+    text = json.dumps(content, sort_keys=True, default=lambda v: getattr(v, '__qualname__', str(v)))
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+def _estimate_numpy(spec, df, settings):
+    from lpmc.engine import model_for
+
+    start = time.perf_counter()
+    res = model_for(spec, df).estimate(**settings)
+    return res, time.perf_counter() - start
+
+
+def _estimate_biogeme(spec, df, settings, formulas=None):
+    import biogeme.database as db
+
+    from lpmc.expressions import biogeme_model, loglike
+    from lpmc.threads import estimation_threads
+
+    formulas = loglike(spec) if formulas is None else formulas
+    threads = estimation_threads(db.Database(spec.name, df), formulas, spec.name)
+    return biogeme_model(spec, df, formulas, threads=threads).estimate(**settings)
+
+
+def estimate(spec, df=None, path=DATA_PATH, engine='numpy', settings=None, formulas=None,
+             store=None, refresh=False):
+    """Stored run (``lpmc.store.Run``) of ``spec`` on the data of ``path``.
+
+    ``df`` is the data of ``path`` if it is already loaded, and ``settings``
+    the keyword arguments of the ``estimate`` method of the engine. With
+    the biogeme engine, ``formulas`` replaces the log likelihood built from
+    the spec, e.g. the expression written in a model script; it must be
+    the same model. With ``refresh`` the model is estimated again.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f'Unknown engine {engine}')
+    settings = dict(settings or {})
+    store = ResultStore() if store is None else store
+    spec_key, data_key = spec_hash(spec), data_hash(path)
+    settings_key = settings_hash(engine, settings)
+    if not refresh:
+        run = store.latest(spec.name, spec_key, data_key, settings_key)
+        if run is not None:
+            return run
+    df = load_data(path) if df is None else df
+    if engine == 'numpy':
+        res, seconds = _estimate_numpy(spec, df, settings)
+        run_id = store.add_estimates(spec.name, spec_key, data_key, res, seconds=seconds,
+                                     settings_hash=settings_key, warm_start='start' in settings)
+    else:
+        results = _estimate_biogeme(spec, df, settings, formulas)
+        run_id = store.add_biogeme(spec.name, spec_key, data_key, results, settings_hash=settings_key,
+                                   warm_start=False)
+    return store.get(run_id)
+
+
+if __name__ == '__main__':
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description='Estimates of a model, estimated only if not stored.')
+    parser.add_argument('model', choices=list(SPECS), help='name of the specification')
+    parser.add_argument('--engine', choices=ENGINES, default='numpy')
+    parser.add_argument('--data', default=DATA_PATH, help='data file')
+    parser.add_argument('--refresh', action='store_true', help='estimate even if stored')
+    parser.add_argument('--availability', choices=['availability', 'availability_driver'], default=None,
+                        help='column of the availability bitmask of the alternatives')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    spec = SPECS[args.model]._replace(availability=args.availability)
+    run = estimate(spec, path=args.data, engine=args.engine, refresh=args.refresh)
+    print(pd.DataFrame({'Value': run.values, 'Rob. Std err': run.std_err()}, index=run.names))
+    print(f'Likelihood: {run.loglike}')
+    print(f'Run {run.id} ({run.engine}, {time.strftime("%Y-%m-%d %H:%M", time.localtime(run.created))}), '
+          f'returned in {time.perf_counter() - start:.2f} s')
@@ -0,0 +1,248 @@
+"""
+Mixed logit estimated by maximum simulated likelihood.
+
+The coefficients listed in ``Spec.random`` vary across individuals: with
+location m and scale s, a coefficient is m + s * xi (normal), exp(m + s * xi)
+(lognormal) or -exp(m + s * xi) (neg_lognormal), xi standard normal. The
+probability of the chosen alternative is averaged over R draws of xi per
+observation.
+
+The draws are quasi-random (scrambled Halton or Sobol sequences from
+scipy.stats.qmc), generated once per sample size, number of draws and
+seed, and kept as a float32 ``.npy`` file in ``data/draws`` that is
+memory-mapped afterwards. The utilities must be linear in the parameters
+(Box-Cox terms with a fixed lambda are), so that for a batch of
+observations the utilities of all the draws are one batched matrix
+product of arrays observations x draws x parameters and observations x
+parameters x alternatives. The batches are spread over a pool of forked
+processes, which return the simulated log probabilities and their
+analytic scores.
+
+Run ``python -m lpmc.mixed --draws 1000`` from the root of the repository
+to estimate ``MODEL3_MIXED`` starting from the estimates of model3.
+"""
+
+import argparse
+import multiprocessing
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy import stats
+from scipy.stats import qmc
+
+from lpmc.data import DATA_DIR
+from lpmc.mnl import LogitModel, design_tensor, logsumexp
+
+DRAWS_DIR = os.path.join(DATA_DIR, 'draws')
+METHODS = ('halton', 'sobol', 'random')
+DISTRIBUTIONS = ('normal', 'lognormal', 'neg_lognormal')
+
+# observations per batch: the arrays of a batch hold batch x draws x parameters values
+CHUNK_ROWS = 256
+
+# starting value of the scale parameters
+SCALE_START = 0.1
+
+# model whose batches the forked workers evaluate
+_MODEL = None
+
+
+def _uniform_engine(method, dims, seed):
+    if method == 'halton':
+        return qmc.Halton(dims, scramble=True, seed=seed).random
+    if method == 'sobol':
+        engine = qmc.Sobol(dims, scramble=True, seed=seed)
+
+        def sobol(n):
+            # the sequence is used in consecutive blocks, not powers of 2
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', UserWarning)
+                return engine.random(n)
+        return sobol
+    if method == 'random':
+        rng = np.random.default_rng(seed)
+        return lambda n: rng.random((n, dims))
+    raise ValueError(f'Unknown method {method}, expected one of {METHODS}')
+
+
+def draws(n_obs, n_draws, dims, method='halton', seed=0, directory=DRAWS_DIR):
+    """Standard normal draws (observations x draws x dims), memory-mapped float32.
+
+    Each observation gets ``n_draws`` consecutive points of one sequence.
+    The draws are generated in blocks of observations on the first call and
+    read back from ``directory`` afterwards.
+    """
+    path = os.path.join(directory, f'{method}_{n_obs}x{n_draws}x{dims}_{seed}.npy')
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        out = np.lib.format.open_memmap(tmp, mode='w+', dtype=np.float32, shape=(n_obs, n_draws, dims))
+        uniform = _uniform_engine(method, dims, seed)
+        block = max(1, (1 << 20) // n_draws)
+        for start in range(0, n_obs, block):
+            stop = min(start + block, n_obs)
+            u = np.clip(uniform((stop - start) * n_draws), 1e-10, 1 - 1e-10)
+            out[start:stop] = stats.norm.ppf(u).reshape(stop - start, n_draws, dims)
+        out.flush()
+        del out
+        os.replace(tmp, path)
+    return np.load(path, mmap_mode='r')
+
+
+def start_from_fixed(spec, values):
+    """Starting values of a mixed spec from the estimates of its fixed-coefficient model."""
+    start = dict(values)
+    for name, kind in spec.random.items():
+        if kind != 'normal' and values.get(name):
+            start[name] = np.log(abs(values[name]))
+    return start
+
+
+def _batch(beta, start, stop):
+    return _MODEL.batch(beta, start, stop)
+
+
+class MixedLogit(LogitModel):
+    """Logit with random coefficients, by maximum simulated likelihood."""
+
+    def __init__(self, spec, df, weights=None, n_draws=1000, method='halton', seed=0,
+                 workers=None, chunk_rows=CHUNK_ROWS):
+        super().__init__(spec, df, weights)
+        index = {name: k for k, name in enumerate(self.beta_names)}
+        self.X = design_tensor(spec, df, self.beta_names)
+        self.x_chosen = self.X[np.arange(self.n_obs), self.chosen]
+        # (location, scale, distribution) of each random coefficient
+        self.random = []
+        for name, kind in sorted(spec.random.items()):
+            if kind not in DISTRIBUTIONS:
+                raise ValueError(f'Unknown distribution {kind} of {name}')
+            self.random.append((index[name], index[f'{name}_S'], kind))
+        self.n_draws = n_draws
+        self.draws = draws(self.n_obs, n_draws, len(self.random), method, seed)
+        self.workers = workers or os.cpu_count()
+        self.chunk_rows = chunk_rows
+        self._pool = None
+
+    def start_values(self, start=None):
+        scales = {self.beta_names[s]: SCALE_START for _, s, _ in self.random}
+        return super().start_values({**scales, **(start or {})})
+
+    def utilities(self, beta):
+        raise NotImplementedError('The utilities of a mixed logit depend on the draws')
+
+    def coefficients(self, beta, xi):
+        """Coefficients per observation and draw, and their derivatives by location.
+
+        Returns B (observations x draws x parameters) and, for each random
+        coefficient, dB/dm (observations x draws); dB/ds is dB/dm * xi.
+        """
+        B = np.empty(xi.shape[:2] + (len(beta),))
+        B[:] = beta
+        derivatives = []
+        for d, (k, s, kind) in enumerate(self.random):
+            z = beta[k] + beta[s] * xi[:, :, d]
+            if kind == 'normal':
+                B[:, :, k] = z
+                derivatives.append(np.ones_like(z))
+                continue
+            b = np.exp(z) if kind == 'lognormal' else -np.exp(z)
+            B[:, :, k] = b
+            derivatives.append(b)
+        return B, derivatives
+
+    def _available(self, V, start, stop):
+        if self.available is None:
+            return V
+        return np.where(self.available[start:stop, None, :], V, -np.inf)
+
+    def batch(self, beta, start, stop):
+        """Simulated log probability of the chosen alternatives of rows start:stop, and its scores."""
+        X = self.X[start:stop]
+        xi = np.asarray(self.draws[start:stop], dtype=float)
+        B, derivatives = self.coefficients(beta, xi)
+        V = self._available(B @ X.transpose(0, 2, 1), start, stop)
+        log_P = V - logsumexp(V, axis=2)[:, :, None]
+        log_p = np.take_along_axis(log_P, self.chosen[start:stop, None, None], axis=2)[:, :, 0]
+        log_sim = logsumexp(log_p, axis=1) - np.log(self.n_draws)
+        # share of each draw in the simulated probability
+        w = np.exp(log_p - log_sim[:, None]) / self.n_draws
+        # d log P_nr / d B_nrk
+        G = self.x_chosen[start:stop, None, :] - np.exp(log_P) @ X
+        scores = (w[:, None, :] @ G)[:, 0, :]
+        for d, (k, s, _) in enumerate(self.random):
+            wg = w * G[:, :, k] * derivatives[d]
+            scores[:, k] = wg.sum(axis=1)
+            scores[:, s] = (wg * xi[:, :, d]).sum(axis=1)
+        return log_sim, scores
+
+    def _batches(self):
+        return [(a, min(a + self.chunk_rows, self.n_obs)) for a in range(0, self.n_obs, self.chunk_rows)]
+
+    def _map(self, beta):
+        batches = self._batches()
+        if self.workers == 1:
+            return [self.batch(beta, a, b) for a, b in batches]
+        if self._pool is None:
+            global _MODEL
+            _MODEL = self
+            context = multiprocessing.get_context('fork')
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        starts, stops = zip(*batches)
+        return list(self._pool.map(_batch, [beta] * len(batches), starts, stops))
+
+    def _evaluate(self, beta):
+        self.evaluations += 1
+        log_p, scores = zip(*self._map(np.asarray(beta, dtype=float)))
+        return np.concatenate(log_p), np.concatenate(scores)
+
+    def probabilities(self, beta):
+        """Choice probabilities averaged over the draws."""
+        P = np.empty((self.n_obs, len(self.alternatives)))
+        for a, b in self._batches():
+            B, _ = self.coefficients(beta, np.asarray(self.draws[a:b], dtype=float))
+            V = self._available(B @ self.X[a:b].transpose(0, 2, 1), a, b)
+            P[a:b] = np.exp(V - logsumexp(V, axis=2)[:, :, None]).mean(axis=1)
+        return P
+
+    def close(self):
+        """Stop the worker processes."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def estimate(self, start=None, tol=1e-8, max_iter=1000, covariance=True):
+        try:
+            return super().estimate(start, tol, max_iter, covariance)
+        finally:
+            self.close()
+
+
+if __name__ == '__main__':
+    import time
+
+    from lpmc.data import load_data
+    from lpmc.engine import model_for
+    from lpmc.specs import MODEL3, MODEL3_MIXED
+
+    parser = argparse.ArgumentParser(description='Estimate the mixed logit extension of model3.')
+    parser.add_argument('--draws', type=int, default=1000, help='draws per observation')
+    parser.add_argument('--method', choices=METHODS, default='halton')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None, help='number of processes')
+    args = parser.parse_args()
+
+    df = load_data(columns=MODEL3_MIXED.columns())
+    fixed = model_for(MODEL3, df).estimate(covariance=False)
+    start = start_from_fixed(MODEL3_MIXED, fixed.get_beta_values())
+    t0 = time.perf_counter()
+    model = MixedLogit(MODEL3_MIXED, df, n_draws=args.draws, method=args.method, seed=args.seed,
+                       workers=args.workers)
+    t1 = time.perf_counter()
+    results = model.estimate(start)
+    t2 = time.perf_counter()
+    print(results.to_frame())
+    print(f'Likelihood: {results.loglike} (model3: {fixed.loglike})')
+    print(f'Draws: {t1 - t0:.1f} s, estimation: {t2 - t1:.1f} s, '
+          f'{results.iterations} iterations, {results.evaluations} evaluations')
@@ -0,0 +1,335 @@
+"""
+Vectorized multinomial logit engine.
+
+The utilities of a linear specification are compiled once into a design
+tensor X of shape (observations, alternatives, parameters), so that
+V = X @ beta. Log likelihood, gradient, BHHH matrix and Hessian are then
+evaluated with batched array operations instead of walking an expression
+tree per observation.
+
+Run ``python -m lpmc.mnl model0`` from the root of the repository to
+estimate one of the models in ``lpmc.specs``.
+"""
+
+import sys
+
+import numpy as np
+import pandas as pd
+from scipy import optimize, stats
+
+from lpmc.features import available_alternatives
+from lpmc.profiling import span
+from lpmc.specs import CHOICE, SPECS, boxcox
+
+
+def logsumexp(V, axis=-1):
+    """Numerically stable log(sum(exp(V))) along ``axis``, -inf if all of V is -inf."""
+    m = np.max(V, axis=axis, keepdims=True)
+    m = np.where(np.isfinite(m), m, 0.0)
+    with np.errstate(divide='ignore'):
+        return np.log(np.sum(np.exp(V - m), axis=axis)) + np.squeeze(m, axis=axis)
+
+
+def design_tensor(spec, df, beta_names=None):
+    """Design tensor X with V[n, j] = X[n, j, :] @ beta."""
+    if not spec.is_linear():
+        raise ValueError(f'The utilities of {spec.name} are not linear in the parameters')
+    beta_names = spec.beta_names() if beta_names is None else beta_names
+    index = {name: k for k, name in enumerate(beta_names)}
+    alts = sorted(spec.utilities)
+    X = np.zeros((len(df), len(alts), len(beta_names)))
+    for j, alt in enumerate(alts):
+        for term in spec.utilities[alt]:
+            x = 1.0 if term.column is None else df[term.column].to_numpy(dtype=float)
+            if term.boxcox is not None:
+                # fixed lambda, see Spec.is_linear
+                x = boxcox(x, term.boxcox)
+            if term.segment is not None:
+                by, value = term.segment
+                x = x * (df[by].to_numpy() == value)
+            X[:, j, index[term.beta]] += x
+    return X
+
+
+class Estimates:
+    """Estimated parameters and the statistics reported by biogeme."""
+
+    def __init__(self, names, values, loglike, null_loglike, n_obs, hessian, bhhh,
+                 iterations=None, evaluations=None, message=''):
+        self.names = list(names)
+        self.values = np.asarray(values, dtype=float)
+        self.loglike = loglike
+        self.null_loglike = null_loglike
+        self.n_obs = n_obs
+        self.hessian = hessian
+        self.bhhh = bhhh
+        self.iterations = iterations
+        self.evaluations = evaluations
+        self.message = message
+
+    @property
+    def covariance(self):
+        return np.linalg.pinv(-self.hessian)
+
+    @property
+    def robust_covariance(self):
+        cov = self.covariance
+        return cov @ self.bhhh @ cov
+
+    @property
+    def aic(self):
+        return 2 * len(self.names) - 2 * self.loglike
+
+    @property
+    def bic(self):
+        return len(self.names) * np.log(self.n_obs) - 2 * self.loglike
+
+    def get_beta_values(self):
+        """Same as ``results.getBetaValues()`` in biogeme."""
+        return dict(zip(self.names, self.values.tolist()))
+
+    def to_frame(self):
+        """Same columns as ``results.getEstimatedParameters()`` in biogeme."""
+        std_err = np.sqrt(np.diag(self.robust_covariance))
+        t_test = self.values / std_err
+        return pd.DataFrame({
+            'Value': self.values,
+            'Rob. Std err': std_err,
+            'Rob. t-test': t_test,
+            'Rob. p-value': 2 * stats.norm.sf(np.abs(t_test)),
+        }, index=self.names)
+
+
+class LogitModel:
+    """Logit log likelihood for a given way of computing the utilities.
+
+    Subclasses implement ``utilities(beta)``, which returns the utilities
+    V (observations x alternatives) and their Jacobian dV/dbeta
+    (observations x alternatives x parameters). If the spec names an
+    availability column, the utilities of the unavailable alternatives are
+    set to -inf.
+    """
+
+    # whether hessian() is exact rather than finite differences
+    analytic_hessian = False
+
+    def __init__(self, spec, df, weights=None):
+        self.spec = spec
+        self.beta_names = spec.beta_names()
+        self.alternatives = sorted(spec.utilities)
+        choice = df[CHOICE].to_numpy()
+        self.chosen = np.searchsorted(self.alternatives, choice)
+        self.n_obs = len(df)
+        # observations the rows stand for, in the AIC and BIC (see lpmc.compress)
+        self.sample_size = self.n_obs
+        self.weights = np.ones(self.n_obs) if weights is None else np.asarray(weights, dtype=float)
+        self.evaluations = 0
+        # observations x alternatives, None if everything is available
+        self.available = None
+        if spec.availability is not None:
+            self.available = available_alternatives(df[spec.availability].to_numpy(), self.alternatives)
+            unavailable = ~self.available[np.arange(self.n_obs), self.chosen]
+            if unavailable.any():
+                raise ValueError(f'{unavailable.sum()} observations choose an unavailable alternative')
+
+    def utilities(self, beta):
+        raise NotImplementedError
+
+    def bounds(self):
+        """Bounds on the parameters, in the format of scipy.optimize."""
+        if not self.spec.bounds:
+            return None
+        return [self.spec.bounds.get(name, (None, None)) for name in self.beta_names]
+
+    def start_values(self, start=None):
+        start = start or {}
+        return np.array([start.get(name, 0.0) for name in self.beta_names], dtype=float)
+
+    def available_utilities(self, V):
+        """Utilities with -inf for the unavailable alternatives."""
+        return V if self.available is None else np.where(self.available, V, -np.inf)
+
+    def probabilities(self, beta):
+        V, _ = self.utilities(beta)
+        V = self.available_utilities(V)
+        return np.exp(V - logsumexp(V)[:, None])
+
+    def kernel(self, V, beta):
+        """Log probability of the chosen alternatives and its derivatives.
+
+        Returns log P (observations), d log P / dV (observations x
+        alternatives) and the derivatives with respect to the parameters
+        that do not enter the utilities (observations x parameters, or None).
+        """
+        rows = np.arange(self.n_obs)
+        log_p = V - logsumexp(V)[:, None]
+        d_log_p = -np.exp(log_p)
+        d_log_p[rows, self.chosen] += 1
+        return log_p[rows, self.chosen], d_log_p, None
+
+    def _evaluate(self, beta):
+        """Per-observation log probability of the chosen alternative and its scores."""
+        self.evaluations += 1
+        V, dV = self.utilities(beta)
+        log_p, d_log_p, direct = self.kernel(self.available_utilities(V), beta)
+        scores = np.einsum('nj,njk->nk', d_log_p, dV)
+        if direct is not None:
+            scores += direct
+        return log_p, scores
+
+    def loglike(self, beta):
+        log_p, _ = self._evaluate(beta)
+        return self.weights @ log_p
+
+    def loglike_and_gradient(self, beta):
+        log_p, scores = self._evaluate(beta)
+        return self.weights @ log_p, self.weights @ scores
+
+    def bhhh(self, beta):
+        _, scores = self._evaluate(beta)
+        return scores.T @ (self.weights[:, None] * scores)
+
+    def contributions(self, beta):
+        """Log likelihood, gradient and BHHH matrix from a single evaluation."""
+        log_p, scores = self._evaluate(beta)
+        return (self.weights @ log_p, self.weights @ scores,
+                scores.T @ (self.weights[:, None] * scores))
+
+    def hessian(self, beta, step=1e-6):
+        """Central finite differences of the analytic gradient."""
+        beta = np.asarray(beta, dtype=float)
+        H = np.empty((len(beta), len(beta)))
+        for k in range(len(beta)):
+            h = step * max(1.0, abs(beta[k]))
+            up, down = beta.copy(), beta.copy()
+            up[k] += h
+            down[k] -= h
+            H[:, k] = (self.loglike_and_gradient(up)[1] - self.loglike_and_gradient(down)[1]) / (2 * h)
+        return (H + H.T) / 2
+
+    def null_loglike(self):
+        """Log likelihood of the model with all utilities equal, over the available alternatives."""
+        if self.available is None:
+            return -self.weights.sum() * np.log(len(self.alternatives))
+        return -self.weights @ np.log(self.available.sum(axis=1))
+
+    def estimate(self, start=None, tol=1e-8, max_iter=1000, covariance=True):
+        """Maximum likelihood estimates, starting from ``start`` (name -> value).
+
+        With ``covariance=False`` the Hessian and BHHH matrices at the
+        solution are not computed.
+        """
+        x0 = self.start_values(start)
+        self.evaluations = 0
+
+        def f(beta):
+            with span('loglike+gradient'):
+                ll, grad = self.loglike_and_gradient(beta)
+            return -ll, -grad
+
+        def hess(beta):
+            with span('hessian'):
+                return -self.hessian(beta)
+
+        bounds = self.bounds()
+        with span('optimize'):
+            if bounds is None and self.analytic_hessian:
+                res = optimize.minimize(f, x0, jac=True, hess=hess, method='trust-exact',
+                                        options={'gtol': tol, 'maxiter': max_iter})
+            else:
+                res = optimize.minimize(f, x0, jac=True, bounds=bounds, method='L-BFGS-B',
+                                        options={'gtol': tol, 'ftol': 1e-15, 'maxiter': max_iter})
+        evaluations = self.evaluations
+        hessian = bhhh = None
+        if covariance:
+            with span('covariance'):
+                hessian = self.hessian(res.x)
+                bhhh = self.bhhh(res.x)
+        return Estimates(self.beta_names, res.x, -res.fun, self.null_loglike(), self.sample_size,
+                         hessian, bhhh, iterations=res.nit, evaluations=evaluations,
+                         message=res.message)
+
+
+class MNL(LogitModel):
+    """Multinomial logit with utilities linear in the parameters.
+
+    With an availability column, the observations are grouped by pattern of
+    available alternatives, and each group only holds the design tensor of
+    its rows and available alternatives; there is no full tensor.
+    """
+
+    analytic_hessian = True
+
+    def __init__(self, spec, df, weights=None):
+        super().__init__(spec, df, weights)
+        # (rows, available alternatives, design tensor, chosen position) per pattern
+        if self.available is None:
+            self.groups = [(slice(None), slice(None), design_tensor(spec, df, self.beta_names), self.chosen)]
+            return
+        patterns, inverse = np.unique(self.available, axis=0, return_inverse=True)
+        self.groups = []
+        for p, pattern in enumerate(patterns):
+            rows = np.flatnonzero(inverse.ravel() == p)
+            alts = np.flatnonzero(pattern)
+            available = spec._replace(utilities={self.alternatives[j]: spec.utilities[self.alternatives[j]]
+                                                 for j in alts})
+            X = design_tensor(available, df.iloc[rows], self.beta_names)
+            self.groups.append((rows, alts, X, np.searchsorted(alts, self.chosen[rows])))
+
+    def utilities(self, beta):
+        """Utilities and design tensor of all the alternatives, 0 where unavailable."""
+        if self.available is None:
+            X = self.groups[0][2]
+            return X @ beta, X
+        dV = np.zeros((self.n_obs, len(self.alternatives), len(beta)))
+        for rows, alts, X, _ in self.groups:
+            dV[rows[:, None], alts] = X
+        return dV @ beta, dV
+
+    def _evaluate(self, beta):
+        self.evaluations += 1
+        log_p = np.empty(self.n_obs)
+        scores = np.empty((self.n_obs, len(beta)))
+        for rows, _, X, chosen in self.groups:
+            V = X @ beta
+            log_P = V - logsumexp(V)[:, None]
+            index = np.arange(len(chosen))
+            log_p[rows] = log_P[index, chosen]
+            scores[rows] = X[index, chosen] - np.einsum('nj,njk->nk', np.exp(log_P), X)
+        return log_p, scores
+
+    def probabilities(self, beta):
+        P = np.zeros((self.n_obs, len(self.alternatives)))
+        for rows, alts, X, _ in self.groups:
+            V = X @ beta
+            P_group = np.exp(V - logsumexp(V)[:, None])
+            if isinstance(rows, slice):
+                P[:] = P_group
+            else:
+                P[rows[:, None], alts] = P_group
+        return P
+
+    def hessian(self, beta):
+        """Analytic Hessian: -sum_n w_n sum_j P_nj (x_nj - xbar_n)(x_nj - xbar_n)'."""
+        H = np.zeros((len(beta), len(beta)))
+        for rows, _, X, _ in self.groups:
+            V = X @ beta
+            P = np.exp(V - logsumexp(V)[:, None])
+            xbar = np.einsum('nj,njk->nk', P, X)
+            centered = X - xbar[:, None, :]
+            H -= np.einsum('n,nj,njk,njl->kl', self.weights[rows], P, centered, centered, optimize=True)
+        return H
+
+
+if __name__ == '__main__':
+    from lpmc.data import load_data
+    from lpmc.engine import model_for
+
+    spec = SPECS[sys.argv[1] if len(sys.argv) > 1 else 'model0']
+    df = load_data()
+    model = model_for(spec, df)
+    results = model.estimate()
+    print(results.to_frame())
+    print(f'Null log likelihood: {results.null_loglike}')
+    print(f'Likelihood: {results.loglike}')
+    print(f'Iterations: {results.iterations}, evaluations: {results.evaluations}')
@@ -0,0 +1,118 @@
+"""
+Nested and cross-nested logit kernel with analytic gradients.
+
+With y_jm = alpha_jm**mu_m * exp(mu_m * V_j) and S_m = sum_j y_jm, the
+probability of alternative i is
+
+    P_i = sum_m P(m) * P(i | m),  P(m) = S_m**(1/mu_m) / sum_m' S_m'**(1/mu_m'),
+    P(i | m) = y_im / S_m.
+
+A nested logit is the special case where every alternative belongs to one
+nest with alpha = 1. All the quantities are evaluated in logs with a
+grouped log-sum-exp over an observations x nests x alternatives array, and
+the gradient is exact with respect to both the utilities and the nest
+scales.
+"""
+
+import numpy as np
+
+from lpmc.engine import model_class
+from lpmc.mnl import LogitModel, logsumexp
+
+
+def nest_structure(spec):
+    """Membership mask and log alpha (nests x alternatives) of a nested spec."""
+    alternatives = sorted(spec.utilities)
+    index = {alt: j for j, alt in enumerate(alternatives)}
+    alpha = np.zeros((len(spec.nests), len(alternatives)))
+    for m, (_, alts) in enumerate(spec.nests):
+        if not isinstance(alts, dict):
+            alts = {alt: 1.0 for alt in alts}
+        for alt, a in alts.items():
+            alpha[m, index[alt]] = a
+    member = alpha > 0
+    return member, np.log(np.where(member, alpha, 1.0))
+
+
+def nest_terms(V, mu, member, log_alpha):
+    """Logs of S_m, P(m) and P(i | m) for utilities V (observations x alternatives)."""
+    # log y, (observations, nests, alternatives), -inf outside the nests
+    a = log_alpha[None] + V[:, None, :]
+    log_y = np.where(member[None], mu[None, :, None] * a, -np.inf)
+    log_S = logsumexp(log_y, axis=2)
+    log_G = log_S / mu[None, :]
+    log_Pm = log_G - logsumexp(log_G, axis=1)[:, None]
+    # nests whose alternatives are all unavailable have S_m = 0
+    with np.errstate(invalid='ignore'):
+        log_Pim = np.where(np.isneginf(log_y), -np.inf, log_y - log_S[:, :, None])
+    return a, log_S, log_Pm, log_Pim
+
+
+def nested_probabilities(spec, V, betas):
+    """Choice probabilities of a nested spec for utilities V and betas (name -> value)."""
+    member, log_alpha = nest_structure(spec)
+    mu = np.array([betas[s] if isinstance(s, str) else s for s, _ in spec.nests], dtype=float)
+    _, _, log_Pm, log_Pim = nest_terms(V, mu, member, log_alpha)
+    return np.exp(logsumexp(log_Pm[:, :, None] + log_Pim, axis=1))
+
+
+class NestedLogit(LogitModel):
+    """Cross-nested logit on top of the utilities of another engine."""
+
+    def __init__(self, spec, df, weights=None):
+        super().__init__(spec, df, weights)
+        self.inner = model_class(spec._replace(nests=None))(spec, df, weights)
+        # the inner engine must use the same parameter vector
+        self.inner.beta_names = self.beta_names
+        self.member, self.log_alpha = nest_structure(spec)
+        self.scales = [scale for scale, _ in spec.nests]
+        self.scale_index = [self.beta_names.index(s) if isinstance(s, str) else None for s in self.scales]
+
+    def start_values(self, start=None):
+        # biogeme models start the nest scales at 1, the multinomial logit
+        start = {**{s: 1.0 for s in self.scales if isinstance(s, str)}, **(start or {})}
+        return self.inner.start_values(start)
+
+    def utilities(self, beta):
+        return self.inner.utilities(beta)
+
+    def _mu(self, beta):
+        return np.array([beta[k] if k is not None else s for s, k in zip(self.scales, self.scale_index)])
+
+    def _nest_terms(self, V, beta):
+        mu = self._mu(beta)
+        return (mu, *nest_terms(V, mu, self.member, self.log_alpha))
+
+    def probabilities(self, beta):
+        V, _ = self.utilities(beta)
+        _, _, _, log_Pm, log_Pim = self._nest_terms(self.available_utilities(V), beta)
+        return np.exp(logsumexp(log_Pm[:, :, None] + log_Pim, axis=1))
+
+    def kernel(self, V, beta):
+        rows = np.arange(self.n_obs)
+        i = self.chosen
+        mu, a, log_S, log_Pm, log_Pim = self._nest_terms(V, beta)
+        Pm = np.exp(log_Pm)
+        Pim = np.exp(log_Pim)
+        P = np.einsum('nm,nmj->nj', Pm, Pim)
+
+        # posterior weight of each nest given the chosen alternative
+        log_joint = log_Pm + log_Pim[rows, :, i]
+        log_p = logsumexp(log_joint, axis=1)
+        q = np.exp(log_joint - log_p[:, None])
+
+        # d log P_i / dV_k = sum_m q_m (P(k|m) - P_k + mu_m (delta_ik - P(k|m)))
+        d_log_p = np.einsum('nm,nmk->nk', q, Pim * (1 - mu[None, :, None])) - P
+        d_log_p[rows, i] += q @ mu
+
+        # d log P_i / d mu_m = q_m (dlogG_m + a_im - A_m) - P(m) dlogG_m
+        a_safe = np.where(self.member[None] & np.isfinite(a), a, 0.0)
+        A = np.einsum('nmj,nmj->nm', Pim, a_safe)
+        d_log_G = A / mu[None, :] - np.where(np.isfinite(log_S), log_S, 0.0) / mu[None, :] ** 2
+        d_mu = q * (d_log_G + a_safe[rows, :, i] - A) - Pm * d_log_G
+
+        direct = np.zeros((self.n_obs, len(self.beta_names)))
+        for m, k in enumerate(self.scale_index):
+            if k is not None:
+                direct[:, k] += d_mu[:, m]
+        return log_p, d_log_p, direct
@@ -0,0 +1,252 @@
+"""
+Where the time of an estimation run goes.
+
+A Profiler records nested spans (data loading, database construction,
+expression preparation, each likelihood evaluation, the optimization and
+the covariance matrices) with their wall-clock and CPU time. The CPU time
+is the time of the whole process, biogeme threads included, so CPU over
+wall time divided by the number of threads is the average utilization of
+the threads during a span. The self time of the optimization span, once
+the evaluations are taken out, is the optimizer's own overhead.
+
+The instrumented code calls ``span(name)``, which does nothing unless a
+profiler is active. A run is exported as a Chrome trace (``.json``, for
+chrome://tracing or Perfetto, with the summary table and the evaluation
+counts) and as collapsed stacks (``.folded``, for flamegraph.pl or
+speedscope) of self times in microseconds.
+
+The model scripts are profiled when the environment variable LPMC_PROFILE
+names an output directory, e.g. ``LPMC_PROFILE=profiles python model3/model3.py``.
+Run ``python -m lpmc.profiling model3`` to profile an estimation with the
+numpy engine, ``--engine biogeme`` with biogeme.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import threading
+import time
+from typing import NamedTuple, Tuple
+
+import pandas as pd
+
+# output directory of the profiles of the model scripts
+ENVIRONMENT = 'LPMC_PROFILE'
+
+# profiler the spans are recorded in, if any
+_ACTIVE = None
+
+
+class Span(NamedTuple):
+    name: str
+    stack: Tuple[str, ...]
+    start: float
+    seconds: float
+    cpu_seconds: float
+    thread: int
+
+
+class Profiler:
+    """Nested timed spans of one run."""
+
+    def __init__(self, name, threads=1):
+        self.name = name
+        self.metadata = {'threads': threads}
+        self.spans = []
+        self.origin = time.perf_counter()
+        self._local = threading.local()
+        self._root = None
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextlib.contextmanager
+    def span(self, name):
+        stack = self._stack()
+        stack.append(name)
+        start, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            self.spans.append(Span(name, tuple(stack), start - self.origin, time.perf_counter() - start,
+                                   time.process_time() - cpu, threading.get_ident()))
+            stack.pop()
+
+    def annotate(self, **metadata):
+        """Record facts about the run, e.g. ``threads``."""
+        self.metadata.update(metadata)
+
+    def __enter__(self):
+        global _ACTIVE
+        _ACTIVE = self
+        self._root = self.span(self.name)
+        self._root.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        global _ACTIVE
+        self._root.__exit__(*exc)
+        _ACTIVE = None
+        return False
+
+    def summary(self):
+        """Calls, total, self and CPU time and thread utilization per stack of spans."""
+        rows = {}
+        for span in self.spans:
+            row = rows.setdefault(span.stack, {'calls': 0, 'seconds': 0.0, 'children': 0.0, 'cpu_seconds': 0.0})
+            row['calls'] += 1
+            row['seconds'] += span.seconds
+            row['cpu_seconds'] += span.cpu_seconds
+        for stack, row in rows.items():
+            if stack[:-1] in rows:
+                rows[stack[:-1]]['children'] += row['seconds']
+        table = pd.DataFrame(list(rows.values()), index=[';'.join(stack) for stack in rows])
+        table['self_seconds'] = table['seconds'] - table.pop('children')
+        table['utilization'] = table['cpu_seconds'] / (table['seconds'] * self.metadata['threads'])
+        return table.sort_index()
+
+    def counts(self):
+        """Number of spans by name, e.g. the number of likelihood evaluations."""
+        counts = {}
+        for span in self.spans:
+            counts[span.name] = counts.get(span.name, 0) + 1
+        return counts
+
+    def trace(self):
+        """The spans in the Chrome trace event format."""
+        pid = os.getpid()
+        events = [{'name': span.name, 'cat': self.name, 'ph': 'X', 'pid': pid, 'tid': span.thread,
+                   'ts': span.start * 1e6, 'dur': span.seconds * 1e6,
+                   'args': {'cpu_ms': span.cpu_seconds * 1e3}}
+                  for span in sorted(self.spans, key=lambda span: span.start)]
+        return {'traceEvents': events, 'displayTimeUnit': 'ms',
+                'metadata': dict(self.metadata, name=self.name, counts=self.counts())}
+
+    def collapsed(self):
+        """Collapsed stacks: one ``a;b;c microseconds`` line of self time per stack."""
+        table = self.summary()
+        return [f'{stack} {round(max(seconds, 0.0) * 1e6)}' for stack, seconds in table['self_seconds'].items()]
+
+    def save(self, directory):
+        """Write ``{name}.json`` and ``{name}.folded`` in ``directory``, return their paths."""
+        os.makedirs(directory, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        base = os.path.join(directory, f'{self.name}-{stamp}')
+        trace = self.trace()
+        trace['summary'] = json.loads(self.summary().to_json(orient='index'))
+        with open(base + '.json', 'w') as f:
+            json.dump(trace, f, indent=1)
+        with open(base + '.folded', 'w') as f:
+            f.write('\n'.join(self.collapsed()) + '\n')
+        return base + '.json', base + '.folded'
+
+
+def span(name):
+    """Timed span in the active profiler, or a no-op."""
+    return _ACTIVE.span(name) if _ACTIVE is not None else contextlib.nullcontext()
+
+
+def annotate(**metadata):
+    if _ACTIVE is not None:
+        _ACTIVE.annotate(**metadata)
+
+
+def start(name, directory=None):
+    """Start profiling a script if ``directory`` or LPMC_PROFILE is set; see ``finish``."""
+    directory = directory or os.environ.get(ENVIRONMENT)
+    if not directory:
+        return None
+    profiler = Profiler(name).__enter__()
+    profiler.annotate(directory=directory)
+    return profiler
+
+
+def finish():
+    """Stop the profiler of ``start``, save it and print its summary."""
+    profiler = _ACTIVE
+    if profiler is None:
+        return None
+    profiler.__exit__(None, None, None)
+    paths = profiler.save(profiler.metadata['directory'])
+    print(profiler.summary())
+    print(f'Profile written to {paths[0]} and {paths[1]}')
+    return paths
+
+
+def instrument_biogeme(biogeme):
+    """Time each likelihood evaluation of a BIOGEME object, named by the derivatives it computes.
+
+    The final evaluation with both the Hessian and the BHHH matrix is the
+    one of the covariance matrices.
+    """
+    evaluate = biogeme.calculateLikelihoodAndDerivatives
+    likelihood = biogeme.calculateLikelihood
+
+    def timed_evaluate(x, scaled, hessian=False, bhhh=False, *args, **kwargs):
+        name = 'loglike+gradient' + ('+hessian' if hessian else '') + ('+bhhh' if bhhh else '')
+        with span(name):
+            return evaluate(x, scaled, hessian, bhhh, *args, **kwargs)
+
+    def timed_likelihood(*args, **kwargs):
+        with span('loglike'):
+            return likelihood(*args, **kwargs)
+
+    biogeme.calculateLikelihoodAndDerivatives = timed_evaluate
+    biogeme.calculateLikelihood = timed_likelihood
+    return biogeme
+
+
+def _profile_numpy(spec):
+    from lpmc.data import load_data
+    from lpmc.engine import model_for
+
+    df = load_data(columns=spec.columns())
+    with span('prepare model'):
+        model = model_for(spec, df)
+    return model.estimate()
+
+
+def _profile_biogeme(spec):
+    import biogeme.database as db
+
+    from lpmc.data import load_data
+    from lpmc.expressions import biogeme_model, loglike
+    from lpmc.threads import estimation_threads
+
+    df = load_data()
+    with span('database'):
+        database = db.Database(spec.name, df)
+    with span('tune threads'):
+        threads = estimation_threads(database, loglike(spec), spec.name)
+    annotate(threads=threads)
+    with span('prepare expressions'):
+        biogeme = instrument_biogeme(biogeme_model(spec, df, threads=threads))
+    with span('estimate'):
+        return biogeme.estimate()
+
+
+if __name__ == '__main__':
+    # the instrumented modules see the profiler of lpmc.profiling, not of __main__
+    from lpmc.profiling import Profiler, _profile_biogeme, _profile_numpy
+    from lpmc.specs import SPECS
+
+    parser = argparse.ArgumentParser(description='Profile the estimation of a model.')
+    parser.add_argument('model', choices=list(SPECS))
+    parser.add_argument('--engine', choices=['numpy', 'biogeme'], default='numpy')
+    parser.add_argument('--output', default='profiles', help='directory of the trace files')
+    args = parser.parse_args()
+
+    pd.set_option('display.width', 200)
+    pd.set_option('display.max_columns', None)
+    with Profiler(args.model) as profiler:
+        if args.engine == 'numpy':
+            _profile_numpy(SPECS[args.model])
+        else:
+            _profile_biogeme(SPECS[args.model])
+    print(profiler.summary())
+    print(profiler.counts())
+    for path in profiler.save(args.output):
+        print(f'Written {path}')
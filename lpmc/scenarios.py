@@ -0,0 +1,106 @@
+"""
+Batch simulation of policy scenarios.
+
+A scenario is a set of column transforms, for example
+``Scenario('PT cost -15%', {'cost_transit': 0.85})``: a number multiplies the
+column, a function maps the column to its new values. A transformed input
+of a derived column of ``lpmc.features`` (``cost_driving_ccharge`` for
+``cost_driving``) makes the derived column recomputed. The utilities of the
+base case are computed once; each scenario only re-evaluates the
+alternatives whose utility uses a changed column. With an availability
+column, the mask is taken from the scenario's data, so a scenario that
+removes a route (``dur_pt_rail``, ``dur_driving``...) makes the alternative
+unavailable.
+"""
+
+from typing import Callable, Dict, NamedTuple, Union
+
+import numpy as np
+import pandas as pd
+
+from lpmc.engine import choice_probabilities
+from lpmc.features import DERIVED, available_alternatives
+from lpmc.specs import ALTERNATIVES
+
+
+class Scenario(NamedTuple):
+    name: str
+    transforms: Dict[str, Union[float, Callable]]
+
+    def apply(self, data, column):
+        transform = self.transforms[column]
+        x = np.asarray(data[column], dtype=float)
+        return transform(x) if callable(transform) else x * transform
+
+
+def sweep(column, factors, label=None):
+    """One scenario per factor applied to ``column``, e.g. a grid of fare levels."""
+    label = label or column
+    return [Scenario(f'{label} x{factor:g}', {column: factor}) for factor in factors]
+
+
+def _columns(terms):
+    columns = {term.column for term in terms if term.column is not None}
+    return columns | {term.segment[0] for term in terms if term.segment is not None}
+
+
+def scenario_columns(spec, data, scenario):
+    """New values of the columns of ``spec`` that ``scenario`` changes.
+
+    The derived columns used by ``spec`` are recomputed when one of their
+    inputs is transformed, so ``data`` must hold those inputs.
+    """
+    used = set(spec.columns())
+    derived = {name: DERIVED[name] for name in used if name in DERIVED}
+    unused = [col for col in scenario.transforms
+              if col not in used and not any(col in d.inputs for d in derived.values())]
+    if unused:
+        raise ValueError(f'Scenario {scenario.name}: {spec.name} uses neither {unused} nor a column derived from it')
+    missing = [col for col in scenario.transforms if col not in data]
+    if missing:
+        raise ValueError(f'Scenario {scenario.name}: {missing} missing from the data')
+    values = {col: scenario.apply(data, col) for col in scenario.transforms}
+    for name, definition in derived.items():
+        if name in scenario.transforms or not set(definition.inputs) & set(scenario.transforms):
+            continue
+        missing = [col for col in definition.inputs if col not in data]
+        if missing:
+            raise ValueError(f'Scenario {scenario.name}: {name} cannot be recomputed without {missing}')
+        inputs = {col: values[col] if col in values else np.asarray(data[col]) for col in definition.inputs}
+        values[name] = np.asarray(definition.compute(inputs)).astype(definition.dtype)
+    return values
+
+
+def simulate(spec, data, betas, scenarios, weights=None):
+    """Market shares under each scenario, as a DataFrame scenarios x alternatives.
+
+    ``data`` holds the columns used by ``spec`` (and the inputs of the derived
+    columns a scenario changes), ``betas`` maps names to values
+    and ``weights`` are the sample weights (all 1 by default). The first row is
+    the base case.
+    """
+    alts = sorted(spec.utilities)
+    # utilities before the availability mask, which each scenario applies
+    base = np.column_stack([spec.utility(alt, data, betas) for alt in alts])
+    w = np.ones(len(base)) if weights is None else np.asarray(weights, dtype=float)
+    w = w / w.sum()
+
+    def shares(V, data):
+        if spec.availability is not None:
+            V = np.where(available_alternatives(data[spec.availability], alts), V, -np.inf)
+        return w @ choice_probabilities(spec, V, betas)
+
+    rows = {'base': shares(base, data)}
+    for scenario in scenarios:
+        values = scenario_columns(spec, data, scenario)
+        overlay = {col: data[col] for col in spec.columns() if col in data}
+        overlay.update(values)
+        V = base
+        for j, alt in enumerate(alts):
+            if not _columns(spec.utilities[alt]) & set(values):
+                continue
+            if V is base:
+                V = base.copy()
+            V[:, j] = spec.utility(alt, overlay, betas)
+        rows[scenario.name] = shares(V, overlay)
+    return pd.DataFrame.from_dict(rows, orient='index', columns=[ALTERNATIVES[alt] for alt in alts])
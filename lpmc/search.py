@@ -0,0 +1,110 @@
+"""
+Parallel estimation of a family of specifications.
+
+Specifications are estimated concurrently in a process pool. A
+specification whose parent is also a candidate waits for the parent and
+starts from its estimates. The results are ranked by log likelihood, AIC
+and BIC, with a likelihood ratio test of each model against its parent.
+
+Run ``python -m lpmc.search`` from the root of the repository to estimate
+all the models in ``lpmc.specs``.
+"""
+
+import argparse
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pandas as pd
+from scipy import stats
+
+from lpmc.engine import model_for
+from lpmc.specs import SPECS
+from lpmc.warmstart import inherit
+
+# data of the current search, inherited by the forked workers
+_DATA = None
+
+
+def _estimate(spec, start):
+    return model_for(spec, _DATA).estimate(start)
+
+
+def search(specs, df, workers=None):
+    """Estimate ``specs`` (a list of Spec) on ``df``, return name -> Estimates."""
+    global _DATA
+    _DATA = df
+    specs = {spec.name: spec for spec in specs}
+    children = {name: [] for name in specs}
+    roots = []
+    for spec in specs.values():
+        if spec.parent in specs:
+            children[spec.parent].append(spec.name)
+        else:
+            roots.append(spec.name)
+
+    results = {}
+    context = multiprocessing.get_context('fork')
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), mp_context=context) as pool:
+        pending = {pool.submit(_estimate, specs[name], None): name for name in roots}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = pending.pop(future)
+                results[name] = future.result()
+                parent_values = results[name].get_beta_values()
+                for child in children[name]:
+                    start = inherit(specs[child].beta_names(), parent_values)
+                    pending[pool.submit(_estimate, specs[child], start)] = child
+    return results
+
+
+def ranking(specs, results, sort_by='bic'):
+    """Table comparing the estimated specifications."""
+    parents = {spec.name: spec.parent for spec in specs}
+    rows = []
+    for name, res in results.items():
+        row = {
+            'model': name,
+            'parent': parents[name],
+            'n_params': len(res.names),
+            'loglike': res.loglike,
+            'rho_square': 1 - res.loglike / res.null_loglike,
+            'aic': res.aic,
+            'bic': res.bic,
+            'iterations': res.iterations,
+        }
+        parent = results.get(parents[name])
+        if parent is not None:
+            df = len(res.names) - len(parent.names)
+            lr = -2 * (parent.loglike - res.loglike)
+            row.update(lr_stat=lr, lr_df=df, lr_p_value=stats.chi2.sf(lr, df) if df > 0 else float('nan'))
+        rows.append(row)
+    return pd.DataFrame(rows).set_index('model').sort_values(sort_by)
+
+
+if __name__ == '__main__':
+    from lpmc.data import load_data
+
+    parser = argparse.ArgumentParser(description='Estimate and rank several specifications.')
+    parser.add_argument('models', nargs='*', default=list(SPECS), help='names of the specifications')
+    parser.add_argument('--workers', type=int, default=None, help='number of processes')
+    parser.add_argument('--sort', default='bic', help='column used to rank the models')
+    parser.add_argument('--record', action='store_true', help='record the estimates in the result store')
+    args = parser.parse_args()
+
+    candidates = [SPECS[name] for name in args.models]
+    results = search(candidates, load_data(), workers=args.workers)
+    if args.record:
+        from lpmc.store import ResultStore, data_hash, spec_hash
+
+        store = ResultStore()
+        version = data_hash()
+        names = {spec.name for spec in candidates}
+        for spec in candidates:
+            # the children start from the estimates of their parent
+            store.add_estimates(spec.name, spec_hash(spec), version, results[spec.name],
+                                warm_start=spec.parent in names)
+    pd.set_option('display.width', 200)
+    pd.set_option('display.max_columns', None)
+    print(ranking(candidates, results, args.sort))
@@ -0,0 +1,257 @@
+"""
+Local forecasting service.
+
+The parameters of the models are loaded once at startup, from the result
+store, estimating a model only if it has no stored run on the current data
+(see ``lpmc.memo``). The service then answers over HTTP with JSON:
+
+    GET  /models      the models and their parameters
+    POST /predict     {"model": "model3", "trips": [{"dur_walking": 0.5, ...}, ...]}
+                      -> probabilities per trip and market shares
+    POST /scenarios   {"model": "model3", "scenarios": [{"name": "PT -15%",
+                      "transforms": {"cost_transit": 0.85}}], "trips": [...]}
+                      -> market shares per scenario, on the LPMC sample if
+                      no trips are given
+
+A trip holds the columns the model uses; the derived columns of
+``lpmc.features`` (dur_pt, cost_driving, age_group...) are computed from the
+raw ones when missing. Concurrent /predict requests are queued and
+evaluated together: a batch is closed after ``max_wait`` seconds or
+``max_rows`` trips, and the trips of each model are evaluated with one
+vectorized pass.
+
+Run ``python -m lpmc.service --port 8000`` from the root of the repository.
+"""
+
+import argparse
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, NamedTuple
+
+import numpy as np
+
+from lpmc.engine import choice_probabilities
+from lpmc.features import DERIVED, add_derived
+from lpmc.specs import ALTERNATIVES, CHOICE, SPECS
+
+# a batch is evaluated after this many seconds or rows, whichever comes first
+MAX_WAIT = 0.002
+MAX_ROWS = 10_000
+
+
+class Request(NamedTuple):
+    model: str
+    data: Dict[str, np.ndarray]
+    n_rows: int
+    future: Future
+
+
+def load_betas(models, path=None, store=None):
+    """Parameters (name -> value) of each model, estimated only if not stored."""
+    from lpmc import memo
+    from lpmc.data import DATA_PATH
+
+    path = path or DATA_PATH
+    return {name: memo.estimate(SPECS[name], path=path, store=store).get_beta_values() for name in models}
+
+
+def trip_columns(spec, trips, extra=()):
+    """Columns of ``trips`` (a list of dicts) that ``spec`` uses, plus ``extra``, as arrays."""
+    if not trips:
+        raise ValueError('No trips')
+    needed = [col for col in spec.columns() if col != CHOICE]
+    given = set(trips[0])
+    derived = [col for col in needed if col not in given and col in DERIVED
+               and set(DERIVED[col].inputs) <= given]
+    missing = [col for col in needed if col not in given and col not in derived]
+    if missing:
+        raise ValueError(f'Missing columns for {spec.name}: {missing}')
+    inputs = set(needed) | set(extra) | {col for name in derived for col in DERIVED[name].inputs}
+    try:
+        data = {col: np.array([trip[col] for trip in trips], dtype=float) for col in sorted(inputs & given)}
+    except KeyError as e:
+        raise ValueError(f'Column {e} missing from some trips') from None
+    return add_derived(data, derived)
+
+
+class Batcher:
+    """Evaluates the queued requests in batches, on a background thread."""
+
+    def __init__(self, betas, max_wait=MAX_WAIT, max_rows=MAX_ROWS):
+        self.betas = betas
+        self.max_wait = max_wait
+        self.max_rows = max_rows
+        self.queue = queue.Queue()
+        self.batches = 0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, model, data):
+        """Future of the probabilities (trips x alternatives) of ``data`` under ``model``."""
+        n_rows = len(next(iter(data.values())))
+        request = Request(model, data, n_rows, Future())
+        self.queue.put(request)
+        return request.future
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    def _collect(self, first):
+        batch, rows = [first], first.n_rows
+        deadline = time.monotonic() + self.max_wait
+        while rows < self.max_rows:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if request is None:
+                self.queue.put(None)
+                break
+            batch.append(request)
+            rows += request.n_rows
+        return batch
+
+    def _run(self):
+        while True:
+            first = self.queue.get()
+            if first is None:
+                return
+            batch = self._collect(first)
+            self.batches += 1
+            for model in {request.model for request in batch}:
+                self._evaluate([request for request in batch if request.model == model])
+
+    def _evaluate(self, requests):
+        try:
+            spec, betas = SPECS[requests[0].model], self.betas[requests[0].model]
+            columns = set.intersection(*(set(request.data) for request in requests))
+            data = {col: np.concatenate([request.data[col] for request in requests]) for col in columns}
+            P = choice_probabilities(spec, spec.utility_matrix(data, betas), betas)
+        except Exception as e:
+            for request in requests:
+                request.future.set_exception(e)
+            return
+        offsets = np.cumsum([0] + [request.n_rows for request in requests])
+        for request, start, stop in zip(requests, offsets[:-1], offsets[1:]):
+            request.future.set_result(P[start:stop])
+
+
+class Service:
+    """The models, their parameters and the request batcher."""
+
+    def __init__(self, betas, sample=None, max_wait=MAX_WAIT, max_rows=MAX_ROWS):
+        self.betas = betas
+        self.sample = sample
+        self.batcher = Batcher(betas, max_wait, max_rows)
+
+    def _spec(self, body):
+        model = body.get('model')
+        if model not in self.betas:
+            raise ValueError(f'Unknown model {model}, expected one of {sorted(self.betas)}')
+        return SPECS[model]
+
+    def models(self):
+        return {name: {'alternatives': [ALTERNATIVES[alt] for alt in sorted(SPECS[name].utilities)],
+                       'columns': [col for col in SPECS[name].columns() if col != CHOICE],
+                       'parameters': betas}
+                for name, betas in self.betas.items()}
+
+    def predict(self, body):
+        spec = self._spec(body)
+        data = trip_columns(spec, body.get('trips'))
+        P = self.batcher.submit(spec.name, data).result()
+        names = [ALTERNATIVES[alt] for alt in sorted(spec.utilities)]
+        weights = body.get('weights')
+        shares = P.mean(axis=0) if weights is None else np.asarray(weights, dtype=float) @ P / np.sum(weights)
+        return {'model': spec.name, 'alternatives': names, 'probabilities': P.tolist(),
+                'shares': dict(zip(names, shares.tolist()))}
+
+    def scenarios(self, body):
+        from lpmc.scenarios import Scenario, simulate
+
+        spec = self._spec(body)
+        scenarios = []
+        for scenario in body.get('scenarios', []):
+            transforms = {col: float(factor) for col, factor in scenario['transforms'].items()}
+            scenarios.append(Scenario(scenario['name'], transforms))
+        transformed = {col for scenario in scenarios for col in scenario.transforms}
+        data = trip_columns(spec, body['trips'], transformed) if body.get('trips') else self.sample
+        if data is None:
+            raise ValueError('No trips and no sample loaded')
+        shares = simulate(spec, data, self.betas[spec.name], scenarios, body.get('weights'))
+        return {'model': spec.name, 'shares': shares.to_dict(orient='index')}
+
+
+class Handler(BaseHTTPRequestHandler):
+    service = None
+    routes = {'/predict': 'predict', '/scenarios': 'scenarios'}
+
+    def _reply(self, status, content):
+        body = json.dumps(content).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/models':
+            self._reply(200, self.service.models())
+        else:
+            self._reply(404, {'error': f'Unknown path {self.path}'})
+
+    def do_POST(self):
+        if self.path not in self.routes:
+            self._reply(404, {'error': f'Unknown path {self.path}'})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            self._reply(200, getattr(self.service, self.routes[self.path])(body))
+        except (ValueError, KeyError, TypeError) as e:
+            self._reply(400, {'error': str(e)})
+        except Exception as e:
+            self._reply(500, {'error': f'{type(e).__name__}: {e}'})
+
+    def log_message(self, format, *args):
+        # one line per request would dominate the latency
+        pass
+
+
+def serve(service, host='127.0.0.1', port=8000):
+    handler = type('ServiceHandler', (Handler,), {'service': service})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+if __name__ == '__main__':
+    from lpmc.data import DATA_PATH, load_data
+
+    parser = argparse.ArgumentParser(description='Serve mode probabilities and market shares over HTTP.')
+    parser.add_argument('--models', nargs='+', choices=list(SPECS), default=list(SPECS))
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--data', default=DATA_PATH, help='data of the estimations and the scenarios')
+    parser.add_argument('--max-wait-ms', type=float, default=MAX_WAIT * 1000, help='batching delay')
+    parser.add_argument('--max-rows', type=int, default=MAX_ROWS, help='trips per batch')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    betas = load_betas(args.models, args.data)
+    service = Service(betas, load_data(args.data), args.max_wait_ms / 1000, args.max_rows)
+    server = serve(service, args.host, args.port)
+    print(f'Loaded {", ".join(args.models)} in {time.perf_counter() - start:.1f} s, '
+          f'listening on http://{args.host}:{args.port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.batcher.close()
@@ -0,0 +1,200 @@
+"""
+Plain-data specifications of the LPMC models.
+
+A specification lists, for each alternative, the terms of its utility. Each
+term is a coefficient multiplied by a column of the data (or by 1 for the
+alternative specific constants), optionally Box-Cox transformed and
+restricted to one segment of the sample. Parameters fixed to zero, like
+ASC_BIKE, are simply left out. Coefficients listed in ``random`` vary
+across individuals (mixed logit, see ``lpmc.mixed``).
+"""
+
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+
+from lpmc.features import available_alternatives
+
+CHOICE = 'travel_mode'
+ALTERNATIVES = {1: 'WALK', 2: 'BIKE', 3: 'PT', 4: 'CAR'}
+AGE_GROUPS = {0: 'young', 1: 'young_adult', 2: 'adult', 3: 'senior'}
+
+
+class Term(NamedTuple):
+    beta: str
+    column: Optional[str] = None  # None for a constant
+    segment: Optional[Tuple[str, int]] = None  # (column, value) the term applies to
+    boxcox: Union[str, float, None] = None  # Box-Cox parameter of the column, a name or a number
+
+
+class Spec(NamedTuple):
+    name: str
+    utilities: Dict[int, List[Term]]
+    parent: Optional[str] = None
+    # (scale, alternatives) per nest, as in biogeme: the scale is a parameter
+    # name or a number, the alternatives a list or a dict {alt: alpha} for
+    # cross-nested models
+    nests: Optional[Tuple] = None
+    bounds: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]] = None
+    # distribution of the random coefficients, by name: 'normal', 'lognormal'
+    # or 'neg_lognormal'; the coefficient is the location and {name}_S the
+    # scale, as in biogeme
+    random: Optional[Dict[str, str]] = None
+    # column of the data holding the availability bitmask of the alternatives
+    # ('availability' or 'availability_driver', see lpmc.features); None if
+    # they are all available
+    availability: Optional[str] = None
+
+    def beta_names(self):
+        """Names of the estimated parameters, sorted like in the biogeme reports."""
+        names = set()
+        for terms in self.utilities.values():
+            for term in terms:
+                names.add(term.beta)
+                if isinstance(term.boxcox, str):
+                    names.add(term.boxcox)
+        for scale, _ in self.nests or ():
+            if isinstance(scale, str):
+                names.add(scale)
+        names.update(f'{name}_S' for name in self.random or ())
+        return sorted(names)
+
+    def is_linear(self):
+        """Whether the utilities are linear in the parameters (Box-Cox with a fixed lambda is)."""
+        return all(not isinstance(term.boxcox, str) for terms in self.utilities.values() for term in terms)
+
+    def columns(self):
+        """Columns of the data referenced by the utilities."""
+        columns = {CHOICE}
+        for terms in self.utilities.values():
+            for term in terms:
+                if term.column is not None:
+                    columns.add(term.column)
+                if term.segment is not None:
+                    columns.add(term.segment[0])
+        if self.availability is not None:
+            columns.add(self.availability)
+        return sorted(columns)
+
+    def utility(self, alt, data, betas):
+        """Utility of alternative ``alt`` for each row of ``data`` (DataFrame or dict of arrays)."""
+        V = np.zeros(n_rows(data))
+        for term in self.utilities[alt]:
+            x = 1.0 if term.column is None else np.asarray(data[term.column], dtype=float)
+            if term.boxcox is not None:
+                x = boxcox(x, lambda_value(term.boxcox, betas))
+            if term.segment is not None:
+                by, value = term.segment
+                x = x * (np.asarray(data[by]) == value)
+            V += betas[term.beta] * x
+        return V
+
+    def utility_matrix(self, data, betas):
+        """Utilities of all the alternatives, shape (rows, alternatives), -inf if unavailable."""
+        V = np.column_stack([self.utility(alt, data, betas) for alt in sorted(self.utilities)])
+        if self.availability is None:
+            return V
+        return np.where(available_alternatives(data[self.availability], sorted(self.utilities)), V, -np.inf)
+
+    def marginal_utility(self, alt, column, data, betas):
+        """Derivative of the utility of ``alt`` with respect to ``column``."""
+        dV = np.zeros(n_rows(data))
+        for term in self.utilities[alt]:
+            if term.column != column:
+                continue
+            dx = np.ones(n_rows(data))
+            if term.boxcox is not None:
+                x = np.asarray(data[column], dtype=float)
+                ell = lambda_value(term.boxcox, betas)
+                dx = np.where(x > 0, np.where(x > 0, x, 1.0) ** (ell - 1), 0.0)
+            if term.segment is not None:
+                by, value = term.segment
+                dx = dx * (np.asarray(data[by]) == value)
+            dV += betas[term.beta] * dx
+        return dV
+
+
+def n_rows(data):
+    """Number of rows of a DataFrame or of a dict of arrays."""
+    if isinstance(data, dict):
+        return len(next(iter(data.values())))
+    return len(data)
+
+
+def lambda_value(boxcox, betas):
+    """Value of the Box-Cox parameter of a term: estimated (a name) or fixed."""
+    return betas[boxcox] if isinstance(boxcox, str) else boxcox
+
+
+def boxcox(x, ell):
+    """Box-Cox transform as in biogeme.models.boxcox: 0 where x is 0, log(x) as ell -> 0."""
+    x = np.asarray(x, dtype=float)
+    positive = x > 0
+    safe = np.where(positive, x, 1.0)
+    if abs(ell) < 1e-5:
+        y = np.log(safe)
+    else:
+        y = (safe ** ell - 1) / ell
+    return np.where(positive, y, 0.0)
+
+
+def segmented(beta, column, by, groups, boxcox=None):
+    """One term per segment, named like biogeme.segmentation does (``B_TIME_WALK_adult``)."""
+    return [Term(f'{beta}_{label}', column, (by, code), boxcox) for code, label in groups.items()]
+
+
+# generic time coefficient
+MODEL0 = Spec('model0', {
+    1: [Term('ASC_WALK'), Term('B_TIME', 'dur_walking')],
+    2: [Term('B_TIME', 'dur_cycling')],
+    3: [Term('ASC_PT'), Term('B_TIME', 'dur_pt'), Term('B_COST', 'cost_transit')],
+    4: [Term('ASC_CAR'), Term('B_TIME', 'dur_driving'), Term('B_COST', 'cost_driving')],
+})
+
+# alternative specific time coefficients
+MODEL1 = Spec('model1', {
+    1: [Term('ASC_WALK'), Term('B_TIME_WALK', 'dur_walking')],
+    2: [Term('B_TIME_BIKE', 'dur_cycling')],
+    3: [Term('ASC_PT'), Term('B_TIME_PT', 'dur_pt'), Term('B_COST', 'cost_transit')],
+    4: [Term('ASC_CAR'), Term('B_TIME_CAR', 'dur_driving'), Term('B_COST', 'cost_driving')],
+}, parent='model0')
+
+# traffic on the car alternative, walking time segmented by age
+MODEL2 = Spec('model2', {
+    1: [Term('ASC_WALK')] + segmented('B_TIME_WALK', 'dur_walking', 'age_group', AGE_GROUPS),
+    2: [Term('B_TIME_BIKE', 'dur_cycling')],
+    3: [Term('ASC_PT'), Term('B_TIME_PT', 'dur_pt'), Term('B_COST', 'cost_transit')],
+    4: [Term('ASC_CAR'), Term('B_TIME_CAR', 'dur_driving'), Term('B_COST', 'cost_driving'),
+        Term('B_DRIVING_TRAFFIC_PERCENT', 'driving_traffic_percent')],
+}, parent='model1')
+
+# Box-Cox transform of the travel times
+MODEL3 = Spec('model3', {
+    1: [Term('ASC_WALK')] + segmented('B_TIME_WALK', 'dur_walking', 'age_group', AGE_GROUPS, boxcox='LAMBDA'),
+    2: [Term('B_TIME_BIKE', 'dur_cycling', boxcox='LAMBDA')],
+    3: [Term('ASC_PT'), Term('B_TIME_PT', 'dur_pt', boxcox='LAMBDA'), Term('B_COST', 'cost_transit')],
+    4: [Term('ASC_CAR'), Term('B_TIME_CAR', 'dur_driving', boxcox='LAMBDA'), Term('B_COST', 'cost_driving'),
+        Term('B_DRIVING_TRAFFIC_PERCENT', 'driving_traffic_percent')],
+}, parent='model2')
+
+# nests of motorized and non-motorized modes
+MODEL4 = MODEL3._replace(
+    name='model4',
+    parent='model3',
+    nests=(('mu', [3, 4]), (1.0, [1, 2])),
+    bounds={'mu': (1, 10)},
+)
+
+SPECS = {spec.name: spec for spec in [MODEL0, MODEL1, MODEL2, MODEL3, MODEL4]}
+
+# lambda of model3 (model3/model3.html), fixed in the mixed logit
+LAMBDA_MODEL3 = 0.3012
+
+# model3 with lognormal (negative) time and cost coefficients; estimated
+# by simulation, so kept out of SPECS and the default searches
+MODEL3_MIXED = Spec('model3_mixed', {
+    alt: [term._replace(boxcox=LAMBDA_MODEL3) if term.boxcox else term for term in terms]
+    for alt, terms in MODEL3.utilities.items()
+}, parent='model3', random={
+    name: 'neg_lognormal' for name in MODEL3.beta_names() if name.startswith(('B_TIME', 'B_COST'))
+})
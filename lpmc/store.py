@@ -0,0 +1,294 @@
+"""
+Store of estimation results.
+
+Every estimation run is one row of a single SQLite file, ``results.sqlite``
+at the root of the repository, indexed by model name, specification hash
+and data hash. A row holds the estimates, the covariance matrices, the
+log likelihoods and the run statistics, so the latest results of a model
+on a given version of the data, or the best model by BIC, are one indexed
+query away instead of being parsed from ``.pickle`` files.
+
+The specification hash covers the utilities, nests and bounds of a Spec
+(not its name); the data hash is the SHA-256 of the data file recorded in
+its cache; the settings hash identifies the engine and optimizer settings
+of memoized runs (see ``lpmc.memo``). Run ``python -m lpmc.store`` to list the stored runs and
+``python -m lpmc.store --best bic`` for the best model on the current data.
+"""
+
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from lpmc.data import DATA_DIR, DATA_PATH, ensure_cache
+
+STORE_PATH = os.path.join(os.path.dirname(DATA_DIR), 'results.sqlite')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    model TEXT NOT NULL,
+    spec_hash TEXT NOT NULL,
+    data_hash TEXT NOT NULL,
+    settings_hash TEXT,
+    engine TEXT NOT NULL,
+    created REAL NOT NULL,
+    n_obs INTEGER,
+    n_params INTEGER,
+    loglike REAL,
+    null_loglike REAL,
+    aic REAL,
+    bic REAL,
+    iterations INTEGER,
+    evaluations INTEGER,
+    seconds REAL,
+    message TEXT,
+    warm_start INTEGER,
+    names TEXT NOT NULL,
+    estimates BLOB NOT NULL,
+    covariance BLOB,
+    robust_covariance BLOB
+);
+CREATE INDEX IF NOT EXISTS runs_model ON runs (model, spec_hash, data_hash, created);
+CREATE INDEX IF NOT EXISTS runs_data ON runs (data_hash, bic);
+"""
+
+# columns missing from the stores created before they were added: settings_hash
+# before the estimates were memoized, warm_start before the warm starts were
+# compared with the cold ones
+MIGRATIONS = {
+    'settings_hash': 'ALTER TABLE runs ADD COLUMN settings_hash TEXT;',
+    'warm_start': 'ALTER TABLE runs ADD COLUMN warm_start INTEGER;',
+}
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS runs_settings ON runs (spec_hash, data_hash, settings_hash, created);
+"""
+
+# columns listed by ResultStore.runs, without the arrays
+SUMMARY = ['id', 'model', 'spec_hash', 'data_hash', 'settings_hash', 'engine', 'created', 'n_obs',
+           'n_params', 'loglike', 'null_loglike', 'aic', 'bic', 'iterations', 'evaluations', 'seconds', 'message',
+           'warm_start']
+
+
+def spec_hash(spec):
+    """Hash of the utilities, nests and bounds of a Spec."""
+    content = {
+        'utilities': {str(alt): [list(term) for term in terms] for alt, terms in spec.utilities.items()},
+        'nests': spec.nests,
+        'bounds': spec.bounds,
+    }
+    if spec.random:
+        content['random'] = spec.random
+    if spec.availability:
+        content['availability'] = spec.availability
+    text = json.dumps(content, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+def data_hash(path=DATA_PATH):
+    """Hash of the data file of ``path``, as recorded in its cache."""
+    source = ensure_cache(path)['source']
+    if 'sha256' in source:
+        return source['sha256'][:16]
+    # generated data: hash of the generator settings
+    text = json.dumps(source, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+class Run(NamedTuple):
+    id: int
+    model: str
+    spec_hash: str
+    data_hash: str
+    settings_hash: Optional[str]
+    engine: str
+    created: float
+    n_obs: Optional[int]
+    n_params: Optional[int]
+    loglike: Optional[float]
+    null_loglike: Optional[float]
+    aic: Optional[float]
+    bic: Optional[float]
+    iterations: Optional[int]
+    evaluations: Optional[int]
+    seconds: Optional[float]
+    message: Optional[str]
+    # 1 if the run started from earlier estimates, 0 if not, None if unknown
+    warm_start: Optional[int]
+    names: List[str]
+    values: np.ndarray
+    covariance: Optional[np.ndarray]
+    robust_covariance: Optional[np.ndarray]
+
+    def get_beta_values(self):
+        """Same as ``results.getBetaValues()`` in biogeme."""
+        return dict(zip(self.names, self.values.tolist()))
+
+    def std_err(self, robust=True):
+        cov = self.robust_covariance if robust else self.covariance
+        return None if cov is None else pd.Series(np.sqrt(np.diag(cov)), index=self.names)
+
+
+def _blob(array):
+    return None if array is None else np.ascontiguousarray(array, dtype=float).tobytes()
+
+
+def _array(blob, k, square=False):
+    if blob is None:
+        return None
+    values = np.frombuffer(blob, dtype=float)
+    return values.reshape(k, k) if square else values
+
+
+def from_estimates(res):
+    """Fields of a run from ``lpmc.mnl.Estimates``."""
+    covariance = res.hessian is not None
+    return {
+        'names': res.names, 'values': res.values, 'loglike': res.loglike,
+        'null_loglike': res.null_loglike, 'n_obs': res.n_obs, 'aic': res.aic, 'bic': res.bic,
+        'iterations': res.iterations, 'evaluations': res.evaluations, 'message': str(res.message),
+        'covariance': res.covariance if covariance else None,
+        'robust_covariance': res.robust_covariance if covariance and res.bhhh is not None else None,
+    }
+
+
+def from_biogeme(results):
+    """Fields of a run from biogeme estimation results."""
+    data = results.data
+    messages = getattr(data, 'optimizationMessages', None) or {}
+    seconds = messages.get('Optimization time')
+    if isinstance(seconds, datetime.timedelta):
+        seconds = seconds.total_seconds()
+    return {
+        'names': list(data.betaNames), 'values': np.asarray(data.betaValues, dtype=float),
+        'loglike': data.logLike, 'null_loglike': data.nullLogLike,
+        'n_obs': data.numberOfObservations, 'aic': data.akaike, 'bic': data.bayesian,
+        'iterations': messages.get('Number of iterations'),
+        'evaluations': messages.get('Number of function evaluations'),
+        'message': messages.get('Cause of termination'),
+        'seconds': seconds if isinstance(seconds, (int, float)) else None,
+        'covariance': data.varCovar, 'robust_covariance': data.robust_varCovar,
+    }
+
+
+class ResultStore:
+    """Estimation runs in a SQLite file."""
+
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+        columns = {row[1] for row in self.connection.execute('PRAGMA table_info(runs)')}
+        for column, migration in MIGRATIONS.items():
+            if column not in columns:
+                self.connection.executescript(migration)
+        self.connection.executescript(INDEXES)
+
+    def close(self):
+        self.connection.close()
+
+    def add(self, model, spec_hash, data_hash, engine, names, values, covariance=None,
+            robust_covariance=None, seconds=None, settings_hash=None, **stats):
+        """Record a run and return its id. ``stats`` are the other columns of the table."""
+        row = dict(stats, model=model, spec_hash=spec_hash, data_hash=data_hash,
+                   settings_hash=settings_hash, engine=engine,
+                   created=time.time(), n_params=len(names), seconds=seconds,
+                   names=json.dumps(list(names)), estimates=_blob(values),
+                   covariance=_blob(covariance), robust_covariance=_blob(robust_covariance))
+        columns = ', '.join(row)
+        marks = ', '.join('?' for _ in row)
+        with self.connection:
+            cursor = self.connection.execute(f'INSERT INTO runs ({columns}) VALUES ({marks})',
+                                             list(row.values()))
+        return cursor.lastrowid
+
+    def add_estimates(self, model, spec_hash, data_hash, res, seconds=None, engine='numpy',
+                      settings_hash=None, warm_start=None):
+        return self.add(model, spec_hash, data_hash, engine, seconds=seconds,
+                        settings_hash=settings_hash, warm_start=warm_start, **from_estimates(res))
+
+    def add_biogeme(self, model, spec_hash, data_hash, results, settings_hash=None, warm_start=None):
+        return self.add(model, spec_hash, data_hash, 'biogeme', settings_hash=settings_hash,
+                        warm_start=warm_start, **from_biogeme(results))
+
+    def _runs(self, where, params, order='created DESC', limit=None):
+        query = f"SELECT {', '.join(SUMMARY)}, names, estimates, covariance, robust_covariance FROM runs"
+        if where:
+            query += ' WHERE ' + ' AND '.join(where)
+        query += f' ORDER BY {order}'
+        if limit is not None:
+            query += f' LIMIT {int(limit)}'
+        runs = []
+        for row in self.connection.execute(query, params):
+            *summary, names, values, cov, robust = row
+            names = json.loads(names)
+            k = len(names)
+            runs.append(Run(*summary, names, _array(values, k), _array(cov, k, True),
+                            _array(robust, k, True)))
+        return runs
+
+    @staticmethod
+    def _filters(model=None, spec_hash=None, data_hash=None, settings_hash=None, warm_start=None):
+        where, params = [], []
+        for column, value in [('model', model), ('spec_hash', spec_hash), ('data_hash', data_hash),
+                              ('settings_hash', settings_hash), ('warm_start', warm_start)]:
+            if value is not None:
+                where.append(f'{column} = ?')
+                params.append(value)
+        return where, params
+
+    def get(self, run_id):
+        runs = self._runs(['id = ?'], [run_id])
+        return runs[0] if runs else None
+
+    def latest(self, model, spec_hash=None, data_hash=None, settings_hash=None, warm_start=None):
+        """Newest run of ``model``, optionally for one spec, data version, settings and kind of start, or None."""
+        runs = self._runs(*self._filters(model, spec_hash, data_hash, settings_hash, warm_start), limit=1)
+        return runs[0] if runs else None
+
+    def best(self, data_hash, by='bic'):
+        """Run with the smallest ``by`` (aic or bic) on a version of the data, or None."""
+        if by not in ('aic', 'bic'):
+            raise ValueError(f'Unknown criterion {by}')
+        runs = self._runs(['data_hash = ?', f'{by} IS NOT NULL'], [data_hash], order=f'{by} ASC', limit=1)
+        return runs[0] if runs else None
+
+    def runs(self, model=None, spec_hash=None, data_hash=None):
+        """Table of the runs, newest first, without the estimates."""
+        where, params = self._filters(model, spec_hash, data_hash)
+        query = f"SELECT {', '.join(SUMMARY)} FROM runs"
+        if where:
+            query += ' WHERE ' + ' AND '.join(where)
+        table = pd.read_sql_query(query + ' ORDER BY created DESC', self.connection, params=params)
+        table['created'] = pd.to_datetime(table['created'], unit='s')
+        return table.set_index('id')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Query the stored estimation results.')
+    parser.add_argument('model', nargs='?', default=None, help='only the runs of this model')
+    parser.add_argument('--best', choices=['aic', 'bic'], default=None,
+                        help='show the best run on the current data by this criterion')
+    parser.add_argument('--store', default=STORE_PATH, help='SQLite file of the results')
+    args = parser.parse_args()
+
+    store = ResultStore(args.store)
+    pd.set_option('display.width', 200)
+    pd.set_option('display.max_columns', None)
+    if args.best:
+        run = store.best(data_hash(), args.best)
+        if run is None:
+            print('No run on the current data')
+        else:
+            print(f'{run.model} (run {run.id}, {run.engine}): {args.best} = {getattr(run, args.best):.3f}')
+            print(pd.DataFrame({'Value': run.values, 'Rob. Std err': run.std_err()}, index=run.names))
+    else:
+        print(store.runs(args.model))
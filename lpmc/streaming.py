@@ -0,0 +1,129 @@
+"""
+Estimation on data streamed in chunks.
+
+The cached data is read in fixed-size chunks of rows. For each chunk the
+log likelihood, gradient, BHHH matrix and (for linear utilities) the
+analytic Hessian are computed and added up, so memory is bounded by the
+chunk size rather than by the sample size. A Newton method with step
+halving only needs one pass over the data per iteration, plus one
+likelihood-only pass per step size tried. The steps are projected on the
+bounds of the spec, e.g. the scale of a nest.
+
+Run ``python -m lpmc.streaming model2 --chunk-size 1000`` from the root of
+the repository.
+"""
+
+import argparse
+
+import numpy as np
+
+from lpmc.data import CHUNK_SIZE, DATA_PATH, iter_chunks
+from lpmc.engine import model_class
+from lpmc.mnl import Estimates
+from lpmc.specs import SPECS
+
+
+class ChunkedModel:
+    """Sums of the contributions of the chunks of a data file."""
+
+    def __init__(self, spec, path=DATA_PATH, chunk_size=CHUNK_SIZE, weight=None):
+        self.spec = spec
+        self.path = path
+        self.chunk_size = chunk_size
+        self.model_class = model_class(spec)
+        self.weight = weight
+        self.beta_names = spec.beta_names()
+        self.n_obs = None
+        self.null_loglike = None
+        self.passes = 0
+
+    def _models(self):
+        columns = self.spec.columns() + ([self.weight] if self.weight else [])
+        for chunk in iter_chunks(self.path, columns=columns, chunk_size=self.chunk_size):
+            weights = None if self.weight is None else chunk[self.weight]
+            yield self.model_class(self.spec, chunk, weights=weights)
+
+    def loglike(self, beta):
+        self.passes += 1
+        return sum(model.loglike(beta) for model in self._models())
+
+    def evaluate(self, beta):
+        """Log likelihood, gradient, Hessian and BHHH matrix in one pass.
+
+        Without an analytic Hessian, minus the BHHH matrix takes its place.
+        """
+        self.passes += 1
+        K = len(self.beta_names)
+        ll, grad, H, B = 0.0, np.zeros(K), np.zeros((K, K)), np.zeros((K, K))
+        n_obs, null_loglike = 0, 0.0
+        for model in self._models():
+            ll_c, grad_c, bhhh_c = model.contributions(beta)
+            ll += ll_c
+            grad += grad_c
+            B += bhhh_c
+            H += model.hessian(beta) if model.analytic_hessian else -bhhh_c
+            n_obs += model.n_obs
+            null_loglike += model.null_loglike()
+        self.n_obs, self.null_loglike = n_obs, null_loglike
+        return ll, grad, H, B
+
+    def start_values(self, start=None):
+        model = next(self._models())
+        return model.start_values(start)
+
+    def bounds(self):
+        """Lower and upper bounds of the parameters, infinite if the spec has none."""
+        bounds = self.spec.bounds or {}
+        lower, upper = zip(*(bounds.get(name, (None, None)) for name in self.beta_names))
+        lower = np.array([-np.inf if b is None else b for b in lower], dtype=float)
+        upper = np.array([np.inf if b is None else b for b in upper], dtype=float)
+        return lower, upper
+
+    def estimate(self, start=None, tol=1e-6, max_iter=100):
+        """Projected Newton iterations with step halving, stopped on the relative gradient.
+
+        The parameters at a bound the gradient pushes against are held there,
+        the Newton step is taken on the others and clipped to the bounds.
+        """
+        lower, upper = self.bounds()
+        beta = np.clip(self.start_values(start), lower, upper)
+        self.passes = 0
+        ll, grad, H, B = self.evaluate(beta)
+        message = 'Maximum number of iterations reached'
+        iterations = 0
+        for iterations in range(1, max_iter + 1):
+            free = ~(((beta <= lower) & (grad < 0)) | ((beta >= upper) & (grad > 0)))
+            direction = np.zeros_like(beta)
+            # least squares, as H is singular at the start of a Box-Cox model:
+            # the Box-Cox parameters do not matter while the coefficients are 0
+            direction[free] = np.linalg.lstsq(-H[np.ix_(free, free)], grad[free], rcond=None)[0]
+            step = 1.0
+            while True:
+                candidate = np.clip(beta + step * direction, lower, upper)
+                ll_candidate = self.loglike(candidate)
+                if ll_candidate >= ll or step < 1e-10:
+                    break
+                step /= 2
+            beta = candidate
+            ll, grad, H, B = self.evaluate(beta)
+            free = ~(((beta <= lower) & (grad < 0)) | ((beta >= upper) & (grad > 0)))
+            relative = np.max(np.abs(grad[free]) * np.maximum(np.abs(beta[free]), 1.0), initial=0.0) / max(abs(ll), 1.0)
+            if relative < tol:
+                message = f'Relative gradient = {relative:.2g}'
+                break
+        return Estimates(self.beta_names, beta, ll, self.null_loglike, self.n_obs, H, B,
+                         iterations=iterations, evaluations=self.passes, message=message)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Estimate a model on data streamed in chunks.')
+    parser.add_argument('model', nargs='?', default='model0', help='name of the specification')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='rows per chunk')
+    parser.add_argument('--data', default=DATA_PATH, help='tab-separated data file')
+    args = parser.parse_args()
+
+    results = ChunkedModel(SPECS[args.model], args.data, args.chunk_size).estimate()
+    print(results.to_frame())
+    print(f'Null log likelihood: {results.null_loglike}')
+    print(f'Likelihood: {results.loglike}')
+    print(f'Iterations: {results.iterations}, passes over the data: {results.evaluations}')
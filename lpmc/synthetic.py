@@ -0,0 +1,132 @@
+"""
+Synthetic LPMC-like samples of any size.
+
+The joint distribution of the covariates is fitted with a Gaussian copula:
+each column keeps its empirical marginal distribution (point masses like
+the zero congestion charges included) and the dependence between columns
+is the correlation of their normal scores. Rows are drawn from the copula
+chunk by chunk, choices are simulated from a specification and a
+parameter vector, and the chunks are appended directly to a binary cache
+(``lpmc.data.CacheWriter``), so millions of rows never sit in memory at
+once. The result is read like the real data, e.g. with
+``iter_chunks('data/synthetic.dat')`` or ``ChunkedModel(spec, 'data/synthetic.dat')``.
+
+Run ``python -m lpmc.synthetic data/synthetic.dat --rows 1000000 --recover``
+from the root of the repository to generate one million trips from the
+estimates of model3 and estimate the model back from them.
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from lpmc.data import CHUNK_SIZE, DTYPES, CacheWriter, cache_path, ensure_cache, load_data
+from lpmc.engine import choice_probabilities
+from lpmc.features import add_derived
+from lpmc.specs import CHOICE, SPECS
+from lpmc.warmstart import ROOT, read_iter_file
+
+# identifiers are numbered, not sampled
+IDENTIFIERS = ('trip_id', 'household_id', 'person_n', 'trip_n')
+COVARIATES = [col for col in DTYPES if col not in IDENTIFIERS and col != CHOICE]
+
+
+def normal_scores(x, rng):
+    """Standard normal quantiles of the ranks of ``x``, ties broken at random."""
+    order = np.lexsort((rng.random(len(x)), x))
+    ranks = np.empty(len(x))
+    ranks[order] = np.arange(1, len(x) + 1)
+    return stats.norm.ppf(ranks / (len(x) + 1))
+
+
+class Copula:
+    """Gaussian copula with the empirical marginals of a sample."""
+
+    def __init__(self, columns, quantiles, dtypes, correlation):
+        self.columns = list(columns)
+        self.quantiles = quantiles
+        self.dtypes = dtypes
+        self.correlation = correlation
+        self.cholesky = np.linalg.cholesky(correlation)
+
+    @classmethod
+    def fit(cls, df, columns=None, seed=0):
+        columns = COVARIATES if columns is None else columns
+        rng = np.random.default_rng(seed)
+        scores = np.column_stack([normal_scores(df[col].to_numpy(), rng) for col in columns])
+        quantiles = {col: np.sort(df[col].to_numpy()) for col in columns}
+        dtypes = {col: df[col].dtype for col in columns}
+        return cls(columns, quantiles, dtypes, np.corrcoef(scores, rowvar=False))
+
+    def _marginal(self, col, u):
+        values = self.quantiles[col]
+        n = len(values)
+        if np.issubdtype(self.dtypes[col], np.integer):
+            return values[np.minimum((u * n).astype(np.int64), n - 1)]
+        # linear interpolation between the order statistics
+        return np.interp(u, (np.arange(n) + 0.5) / n, values).astype(self.dtypes[col])
+
+    def sample(self, n_rows, rng):
+        """DataFrame of ``n_rows`` draws of the covariates."""
+        z = rng.standard_normal((n_rows, len(self.columns))) @ self.cholesky.T
+        u = stats.norm.cdf(z)
+        return pd.DataFrame({col: self._marginal(col, u[:, k]) for k, col in enumerate(self.columns)})
+
+
+def simulate_choices(spec, df, betas, rng):
+    """Alternatives drawn from the choice probabilities of ``spec``."""
+    alts = np.array(sorted(spec.utilities))
+    P = choice_probabilities(spec, spec.utility_matrix(df, betas), betas)
+    u = rng.random(len(df))[:, None]
+    index = (np.cumsum(P, axis=1) < u).sum(axis=1)
+    return alts[np.minimum(index, len(alts) - 1)]
+
+
+def generate(path, n_rows, spec, betas, copula=None, chunk_size=CHUNK_SIZE, seed=0):
+    """Write ``n_rows`` synthetic trips to the cache of ``path``, return its metadata.
+
+    Only the cache directory of ``path`` is written; ``path`` itself never
+    exists. Each chunk has its own random stream, seeded with (seed, chunk).
+    """
+    copula = Copula.fit(load_data(), seed=seed) if copula is None else copula
+    source = {'generator': 'lpmc.synthetic', 'model': spec.name, 'betas': dict(betas),
+              'n_rows': n_rows, 'seed': seed}
+    writer = CacheWriter(cache_path(path), source=source)
+    for k, start in enumerate(range(0, n_rows, chunk_size)):
+        rng = np.random.default_rng([seed, k])
+        chunk = copula.sample(min(chunk_size, n_rows - start), rng)
+        chunk.insert(0, 'trip_id', np.arange(start, start + len(chunk), dtype='int32'))
+        chunk[CHOICE] = simulate_choices(spec, add_derived(chunk.copy()), betas, rng)
+        writer.append(chunk)
+    writer.close()
+    # derived columns are added chunk by chunk, like for the real data
+    return ensure_cache(path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a synthetic LPMC-like sample.')
+    parser.add_argument('path', help='data file whose cache is written, e.g. data/synthetic.dat')
+    parser.add_argument('--rows', type=int, default=1_000_000, help='number of trips')
+    parser.add_argument('--model', default='model3', choices=list(SPECS), help='specification of the choices')
+    parser.add_argument('--betas', default=None, help='biogeme .iter file (default: <model>/__<model>.iter)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='rows per chunk')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--recover', action='store_true', help='estimate the model back from the sample')
+    args = parser.parse_args()
+
+    spec = SPECS[args.model]
+    betas = read_iter_file(args.betas or os.path.join(ROOT, args.model, f'__{args.model}.iter'))
+    meta = generate(args.path, args.rows, spec, betas, chunk_size=args.chunk_size, seed=args.seed)
+    print(f"{meta['n_rows']} rows written to {cache_path(args.path)}")
+
+    if args.recover:
+        from lpmc.streaming import ChunkedModel
+
+        res = ChunkedModel(spec, args.path, chunk_size=args.chunk_size).estimate()
+        table = res.to_frame()[['Value', 'Rob. Std err']]
+        table.insert(0, 'True', pd.Series(betas))
+        table['t-test vs true'] = (table['Value'] - table['True']) / table['Rob. Std err']
+        print(table)
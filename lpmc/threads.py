@@ -0,0 +1,146 @@
+"""
+Number of biogeme threads tuned for the machine and the data.
+
+Instead of a fixed ``numberOfThreads``, a short calibration times one
+evaluation of the log likelihood (or one simulation) for a few thread
+counts: powers of two up to the number of cores, without going below
+ROWS_PER_THREAD observations per thread, and stopping once more threads
+stop paying off. The fastest count is cached per machine, task, model and
+order of magnitude of the sample size, so the calibration only runs once.
+
+Run ``python -m lpmc.threads`` to list the cached choices of this machine,
+``python -m lpmc.threads --clear`` to forget them.
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import time
+
+CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'lpmc', 'threads.json')
+
+# fewer observations per thread are not worth the synchronization
+ROWS_PER_THREAD = 500
+
+# timings per thread count, the fastest is kept
+REPEATS = 3
+
+# stop trying more threads once slower than the best by this factor
+SLOWDOWN = 1.2
+
+
+def machine_key():
+    return f'{platform.node()}/{os.cpu_count()}'
+
+
+def candidates(n_rows, cpu_count=None):
+    """Thread counts worth timing for ``n_rows`` observations."""
+    cpu_count = cpu_count or os.cpu_count() or 1
+    limit = max(1, min(cpu_count, n_rows // ROWS_PER_THREAD))
+    counts = [2 ** k for k in range(int(math.log2(limit)) + 1)]
+    if counts[-1] != limit:
+        counts.append(limit)
+    return counts
+
+
+def size_class(n_rows):
+    """Order of magnitude of the sample size, e.g. '1e3' for 5000 rows."""
+    return f'1e{int(math.log10(max(n_rows, 1)))}'
+
+
+def calibrate(run, counts, repeats=REPEATS):
+    """Seconds taken by ``run(threads)`` for each of the thread ``counts``.
+
+    ``run`` does its setup, then returns a function doing the timed work.
+    """
+    timings = {}
+    for n in counts:
+        work = run(n)
+        best = math.inf
+        for _ in range(repeats):
+            start = time.perf_counter()
+            work()
+            best = min(best, time.perf_counter() - start)
+        timings[n] = best
+        if best > SLOWDOWN * min(timings.values()):
+            break
+    return timings
+
+
+def load_cache(path=CACHE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_cache(cache, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(cache, f, indent=1)
+    os.replace(tmp, path)
+
+
+def tuned_threads(task, name, n_rows, run, path=CACHE_PATH, refresh=False):
+    """Fastest thread count for ``task`` on ``name``, calibrated with ``run`` if not cached."""
+    key = f'{task}/{name}/{size_class(n_rows)}'
+    cache = load_cache(path)
+    entries = cache.setdefault(machine_key(), {})
+    if key in entries and not refresh:
+        return entries[key]['threads']
+    timings = calibrate(run, candidates(n_rows))
+    threads = min(timings, key=timings.get)
+    # re-read, other processes may have tuned other models meanwhile
+    cache = load_cache(path)
+    cache.setdefault(machine_key(), {})[key] = {
+        'threads': threads,
+        'n_rows': n_rows,
+        'seconds': {str(n): t for n, t in timings.items()},
+        'date': time.strftime('%Y-%m-%d'),
+    }
+    _save_cache(cache, path)
+    return threads
+
+
+def estimation_threads(database, formulas, name, path=CACHE_PATH, refresh=False):
+    """Number of threads for estimating ``formulas`` on a biogeme database.
+
+    The calibration evaluates the log likelihood at the starting values.
+    """
+    import biogeme.biogeme as bio
+
+    def run(threads):
+        biogeme = bio.BIOGEME(database, formulas, numberOfThreads=threads)
+        biogeme.modelName = name
+        return biogeme.calculateInitLikelihood
+
+    return tuned_threads('estimate', name, len(database.data), run, path, refresh)
+
+
+def simulation_threads(database, formulas, betas, name, path=CACHE_PATH, refresh=False):
+    """Number of threads for simulating ``formulas`` with the parameters ``betas``."""
+    import biogeme.biogeme as bio
+
+    def run(threads):
+        biogeme = bio.BIOGEME(database, formulas, numberOfThreads=threads)
+        biogeme.modelName = name
+        return lambda: biogeme.simulate(betas)
+
+    return tuned_threads('simulate', name, len(database.data), run, path, refresh)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Thread counts tuned on this machine.')
+    parser.add_argument('--clear', action='store_true', help='forget the choices of this machine')
+    args = parser.parse_args()
+
+    cache = load_cache()
+    if args.clear:
+        cache.pop(machine_key(), None)
+        _save_cache(cache, CACHE_PATH)
+    for key, entry in sorted(cache.get(machine_key(), {}).items()):
+        timings = ', '.join(f'{n}: {t * 1000:.1f} ms' for n, t in entry['seconds'].items())
+        print(f"{key}: {entry['threads']} threads ({timings})")
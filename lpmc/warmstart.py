@@ -0,0 +1,152 @@
+"""
+Starting values from previous estimation runs.
+
+Biogeme leaves the last iterate of a run in ``modelN/__modelN.iter`` and the
+final results in ``modelN/modelN.pickle`` (``modelN~00.pickle`` and so on for
+later runs), and the scripts record their runs in the result store
+(``lpmc.store``). The newest of these, for the model itself or else for its
+parents, gives the starting values of a new run; in the store, the runs of
+the current spec and data come first. The iterations of a warm start are
+compared with those of the last cold start of the same spec and data.
+"""
+
+import glob
+import os
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def inherit(names, values):
+    """Starting values for ``names`` taken from ``values`` (name -> value).
+
+    A name missing from ``values`` falls back on its longest prefix found
+    there, so that B_TIME_CAR starts from B_TIME and B_TIME_WALK_adult from
+    B_TIME_WALK.
+    """
+    start = {}
+    for name in names:
+        parts = name.split('_')
+        for n in range(len(parts), 0, -1):
+            candidate = '_'.join(parts[:n])
+            if candidate in values:
+                start[name] = values[candidate]
+                break
+    return start
+
+
+def read_iter_file(path):
+    """Parameters of a biogeme ``.iter`` file (lines ``name = value``)."""
+    values = {}
+    with open(path) as f:
+        for line in f:
+            if '=' in line:
+                name, value = line.split('=', 1)
+                values[name.strip()] = float(value)
+    return values
+
+
+def read_pickle(path):
+    """Parameters and number of iterations stored in a biogeme ``.pickle`` file."""
+    import biogeme.results as res
+
+    results = res.bioResults(pickleFile=path)
+    messages = getattr(results.data, 'optimizationMessages', None) or {}
+    return results.getBetaValues(), messages.get('Number of iterations')
+
+
+def stored_run(model, root=ROOT, warm_start=None, exact=False):
+    """Latest run of ``model`` in the result store of ``root``, or None.
+
+    A run of the current spec and data is preferred; with ``exact`` there is
+    no fallback on the other runs of ``model``.
+    """
+    path = os.path.join(root, 'results.sqlite')
+    if not os.path.exists(path):
+        return None
+    from lpmc.specs import SPECS
+    from lpmc.store import ResultStore, data_hash, spec_hash
+
+    store = ResultStore(path)
+    try:
+        run = None
+        if model in SPECS:
+            run = store.latest(model, spec_hash(SPECS[model]), data_hash(), warm_start=warm_start)
+        if run is None and not exact:
+            run = store.latest(model, warm_start=warm_start)
+        return run
+    finally:
+        store.close()
+
+
+def cold_start_iterations(model, root=ROOT):
+    """Iterations of the last cold start of ``model`` on the current spec and data, or None."""
+    run = stored_run(model, root, warm_start=False, exact=True)
+    return None if run is None else run.iterations
+
+
+def previous_run(model, root=ROOT):
+    """Newest stored solution of ``model`` as (path, values, iterations), or None."""
+    directory = os.path.join(root, model)
+    files = glob.glob(os.path.join(directory, f'__{model}.iter'))
+    files += glob.glob(os.path.join(directory, f'{model}.pickle'))
+    files += glob.glob(os.path.join(directory, f'{model}~*.pickle'))
+    run = stored_run(model, root)
+    if run is not None and all(os.path.getmtime(f) <= run.created for f in files):
+        path = os.path.join(root, 'results.sqlite')
+        return f'{path}#{run.id}', run.get_beta_values(), run.iterations
+    if not files:
+        return None
+    path = max(files, key=os.path.getmtime)
+    if path.endswith('.iter'):
+        # the iteration count is only stored in the pickles
+        pickles = [f for f in files if f.endswith('.pickle')]
+        iterations = read_pickle(max(pickles, key=os.path.getmtime))[1] if pickles else None
+        return path, read_iter_file(path), iterations
+    values, iterations = read_pickle(path)
+    return path, values, iterations
+
+
+def starting_values(names, model, parents=(), root=ROOT):
+    """Starting values for the parameters ``names`` of ``model``.
+
+    Returns (values, info): ``values`` maps names to starting values, and
+    ``info`` describes the run they come from (None for a cold start).
+    """
+    for source in [model, *parents]:
+        run = previous_run(source, root)
+        if run is None:
+            continue
+        path, values, iterations = run
+        start = inherit(names, values)
+        if start:
+            info = {'model': source, 'path': path, 'iterations': iterations,
+                    'matched': len(start), 'total': len(names),
+                    'cold_start_iterations': cold_start_iterations(model, root)}
+            return start, info
+    return {}, None
+
+
+def warm_start(biogeme, model, parents=(), root=ROOT):
+    """Seed the parameters of a BIOGEME object from the latest stored results."""
+    start, info = starting_values(biogeme.freeBetaNames(), model, parents, root)
+    if start:
+        biogeme.changeInitValues(start)
+    return info
+
+
+def report(info, results):
+    """Print where the starting values came from and the iterations saved over a cold start."""
+    if info is None:
+        print('Cold start: no previous results found')
+        return
+    print(f"Warm start from {os.path.relpath(info['path'], ROOT)} "
+          f"({info['matched']}/{info['total']} parameters)")
+    messages = getattr(results.data, 'optimizationMessages', None) or {}
+    iterations = messages.get('Number of iterations')
+    if iterations is None:
+        return
+    cold = info['cold_start_iterations']
+    if cold is not None:
+        print(f'Iterations: {iterations} (last cold start: {cold}, saved: {cold - iterations})')
+    else:
+        print(f'Iterations: {iterations} (no cold start of this spec and data recorded to compare with)')
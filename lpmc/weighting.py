@@ -0,0 +1,85 @@
+"""
+Post-stratification weights from census data.
+
+Observations are mapped to census cells with one integer code per row, so
+the weights of any number of cells over any dimensions (age bands, sex,
+borough, car ownership...) are computed with a single vectorized pass.
+When only the marginal totals of each dimension are known, ``rake``
+adjusts the weights by iterative proportional fitting.
+
+Weights are normalized to sum to the sample size.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def _codes(index, values, what):
+    codes = index.get_indexer(values)
+    missing = codes < 0
+    if missing.any():
+        raise ValueError(f'{missing.sum()} observations match no {what}')
+    return codes
+
+
+def cell_index(df, cells, dims):
+    """Row of ``cells`` (a DataFrame with one column per dimension) of each observation."""
+    target = pd.MultiIndex.from_frame(cells[dims])
+    if not target.is_unique:
+        raise ValueError('The census cells are not unique')
+    return _codes(target, pd.MultiIndex.from_frame(df[dims]), 'census cell')
+
+
+def cell_table(df, cells, dims, population='population'):
+    """Census cells with their sample size and weight.
+
+    The weight of a cell is N_pop_c / N_pop * n / n_c, with n the sample size.
+    """
+    codes = cell_index(df, cells, dims)
+    table = cells.copy()
+    table['sample'] = np.bincount(codes, minlength=len(cells))
+    empty = (table['sample'] == 0) & (table[population] > 0)
+    if empty.any():
+        raise ValueError(f'No observation in the census cells {list(table.index[empty])}')
+    share = table[population] / table[population].sum()
+    table['weight'] = share * len(df) / table['sample'].where(table['sample'] > 0)
+    return table
+
+
+def cell_weights(df, cells, dims, population='population'):
+    """Weight of each observation, from the population of its census cell."""
+    table = cell_table(df, cells, dims, population)
+    return table['weight'].to_numpy()[cell_index(df, cells, dims)]
+
+
+def rake(df, marginals, max_iter=1000, tol=1e-10):
+    """Weights matching marginal totals by iterative proportional fitting.
+
+    ``marginals`` maps a column of ``df`` to a Series of population totals
+    indexed by the values of that column. Each margin is scaled to the
+    sample size; the iterations stop when all the weighted margins are
+    within ``tol`` (relative) of their targets.
+    """
+    n = len(df)
+    codes, targets = [], []
+    for column, totals in marginals.items():
+        code = _codes(totals.index, df[column], f'category of {column}')
+        empty = (np.bincount(code, minlength=len(totals)) == 0) & (totals.to_numpy() > 0)
+        if empty.any():
+            raise ValueError(f'No observation in the categories {list(totals.index[empty])} of {column}')
+        codes.append(code)
+        targets.append(totals.to_numpy(dtype=float) * n / totals.sum())
+    w = np.ones(n)
+    for _ in range(max_iter):
+        for code, target in zip(codes, targets):
+            current = np.bincount(code, weights=w, minlength=len(target))
+            w *= (target / np.where(current > 0, current, 1.0))[code]
+        # absolute error for the categories with no population
+        error = max(np.max(np.abs(np.bincount(code, weights=w, minlength=len(target)) - target)
+                           / np.where(target > 0, target, 1.0))
+                    for code, target in zip(codes, targets))
+        if error < tol:
+            break
+    else:
+        raise RuntimeError(f'Raking did not converge in {max_iter} iterations (error {error:.2g})')
+    return w
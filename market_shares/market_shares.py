@@ -5,54 +5,58 @@ from biogeme import models
 from biogeme.expressions import Beta, Variable, log, exp
 import biogeme.segmentation as seg
 import numpy as np
+import argparse
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from lpmc import memo
+from lpmc.data import load_data
+from lpmc.bootstrap import bootstrap, biogeme_estimator
+from lpmc.forecast import forecast
+from lpmc.intervals import covariance_frame, share_intervals, simulation_intervals
+from lpmc.specs import MODEL3
+from lpmc.threads import simulation_threads
+from lpmc.weighting import cell_table, cell_weights
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Weighted market shares of model3.')
+    parser.add_argument('--intervals', choices=['bootstrap', 'delta', 'simulation'], default='bootstrap',
+                        help='confidence intervals by bootstrap (slow, for validation), delta method '
+                             'or simulation from the robust covariance of the estimates')
+    parser.add_argument('--draws', type=int, default=5000, help='draws of the parameters for --intervals simulation')
+    args = parser.parse_args()
+
     # load the data
-    df = pd.read_csv('../data/lpmc01.dat', sep= '\t') 
+    df = load_data() 
 
 
     ## Question 1: Weights ##
 
 
-    census = {
-        'OLD_MEN': 1633263,
-        'YG_MEN': 2676249,
-        'OLD_WOMEN': 1765143,
-        'YG_WOMEN': 2599058,
-    }
+    census = pd.DataFrame({
+        'old': [1, 0, 1, 0],
+        'female': [0, 0, 1, 1],
+        'population': [1633263, 2676249, 1765143, 2599058],
+    }, index=['OLD_MEN', 'YG_MEN', 'OLD_WOMEN', 'YG_WOMEN'])
 
-    #define new filters for strata 
-    filters = {
-        'OLD_MEN': (df.age > 40) & (df.female == 0),
-        'YG_MEN': (df.age <= 40) & (df.female == 0),
-        'OLD_WOMEN': (df.age > 40) & (df.female == 1),
-        'YG_WOMEN': (df.age <= 40) & (df.female == 1),
-    }
+    # strata: older than 40, and sex
+    df['old'] = (df['age'] > 40).astype('int8')
 
-    pop_total = sum(census.values())
+    pop_total = census['population'].sum()
     print("\nTotal population: ", pop_total)
 
-    #count the number of observations in each strata
-    sample_segments = {
-        k: v.sum() for k, v in filters.items()
-    }
-    print("\nSample segments: ", sample_segments)
+    # sample size and weight of each stratum
+    strata = cell_table(df, census, ['old', 'female'])
+    print("\nSample segments: ", strata['sample'].to_dict())
 
-    total_sample = sum(sample_segments.values())
+    total_sample = strata['sample'].sum()
     print("\nTotal sample: ", total_sample)
-
-    # strata weights
-    weights = {
-        k: census[k] * total_sample / (v * pop_total) 
-        for k, v in sample_segments.items()
-    }
-    print("\nWeights: ", weights)
+    print("\nWeights: ", strata['weight'].to_dict())
 
     # insert the weights into the database for each person
-    for k, f in filters.items():
-        df.loc[f, 'Weight'] = weights[k] 
-    
+    df['Weight'] = cell_weights(df, census, ['old', 'female'])
+
     # check that the weights sum up to the sample size
     sum_weights = df['Weight'].sum()
     print("\nSum of weights (should be equal to sample size): ", sum_weights)
@@ -63,12 +67,11 @@ if __name__ == '__main__':
     # to predict the probability of choosing each mode. We multiply this by
     # the weight of each person, and sum over all persons. This gives the 
     # predicted market share of each mode.
-    # The confidence interval is computed with bootstrapping.
+    # The confidence interval is computed with bootstrapping, or in seconds
+    # from the covariance of the estimates with --intervals delta|simulation.
 
     
     database = db.Database('LPMC', df)
-    # create age_group column
-    df['age_group'] = pd.cut(df['age'], [0, 16, 30, 60, 1000], labels=[0, 1, 2, 3])
 
     # import model_pref
     from model_pref import V_WALK, V_BIKE, V_PT, V_CAR, logprob
@@ -77,56 +80,68 @@ if __name__ == '__main__':
     prob_PT = exp(V_PT) / (exp(V_WALK) + exp(V_BIKE) + exp(V_PT) + exp(V_CAR))
     prob_CAR = 1 - prob_WALK - prob_BIKE - prob_PT
 
-    biogeme = bio.BIOGEME(database, logprob)
-    biogeme.modelName = 'lpmc_model'
-    results = biogeme.estimate()
-
-    # compute choice probability for each alternative, for each observation
-    Weight = Variable('Weight')
-    simulate = {
-        'Weight': Weight,
-        'prob_WALK': prob_WALK,
-        'prob_BIKE': prob_BIKE,
-        'prob_PT': prob_PT,
-        'prob_CAR': prob_CAR,
-    }
-    biosim = bio.BIOGEME(database, simulate)
-
-    # get market shares
-    simulated_values = biosim.simulate(results.getBetaValues())
-
-    for mode in ['WALK', 'BIKE', 'PT', 'CAR']:
-        simulated_values[f'Weighted {mode}'] = (
-            simulated_values['Weight'] * 
-            simulated_values[f'prob_{mode}']
-        )
-
-    # bootstrap the data
-    N_boot = 200
-    print(f"Bootstrapping {N_boot} times...")
-    results_bootstrapping = biogeme.estimate(bootstrap=N_boot)
-    betas = biogeme.freeBetaNames()
-    b = results_bootstrapping.getBetasForSensitivityAnalysis(betas)
-
-    # confidence interval of 90%
-    left, right = biosim.confidenceIntervals(b, 0.9)
-
-    for mode in ['WALK', 'BIKE', 'PT', 'CAR']:
-        left['Weighted ' + mode] = (
-            left['Weight'] * 
-            left['prob_' + mode]
-        )
-        right['Weighted ' + mode] = (
-            right['Weight'] * 
-            right['prob_' + mode]
-        )
+    # model3 estimates on this version of the data, from the result store;
+    # the model is only estimated (and recorded) if they are missing
+    run = memo.estimate(MODEL3, df, engine='biogeme', formulas=logprob)
+    betas = run.get_beta_values()
+
+    # get market shares, summed without keeping the simulated probabilities
+    # of each observation
+    market_shares = forecast(MODEL3, betas, df, weight='Weight')
+
+    if args.intervals == 'bootstrap':
+        # compute choice probability for each alternative, for each observation
+        Weight = Variable('Weight')
+        simulate = {
+            'Weight': Weight,
+            'prob_WALK': prob_WALK,
+            'prob_BIKE': prob_BIKE,
+            'prob_PT': prob_PT,
+            'prob_CAR': prob_CAR,
+        }
+        threads = simulation_threads(database, simulate, betas, 'lpmc_model')
+        biosim = bio.BIOGEME(database, simulate, numberOfThreads=threads)
+
+        # bootstrap the data: the resamples are drawn up front, estimated in
+        # parallel from the full sample estimates, and saved in bootstrap/ so an
+        # interrupted run resumes where it stopped
+        N_boot = 200
+        print(f"Bootstrapping {N_boot} times...")
+        boot_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bootstrap')
+        b = bootstrap(biogeme_estimator(df, logprob), len(df), N_boot,
+                      start=betas, directory=boot_dir)
+
+        # confidence interval of 90%
+        left, right = biosim.confidenceIntervals(b, 0.9)
+
+        for mode in ['WALK', 'BIKE', 'PT', 'CAR']:
+            left['Weighted ' + mode] = (
+                left['Weight'] * 
+                left['prob_' + mode]
+            )
+            right['Weighted ' + mode] = (
+                right['Weight'] * 
+                right['prob_' + mode]
+            )
  
-    for mode in ['WALK', 'BIKE', 'PT', 'CAR']:
-        left_str = '{:.2f}'.format(left["Weighted " + mode].mean())
-        right_str = '{:.2f}'.format(right["Weighted " + mode].mean())
-        print(f'Market share for {mode}: {100*simulated_values[f"Weighted {mode}"].mean():.2f}% ')
-        print(f'90% Confidence interval: [-{left_str}, +{right_str}]%')
-        print()
+        for mode in ['WALK', 'BIKE', 'PT', 'CAR']:
+            left_str = '{:.2f}'.format(left["Weighted " + mode].mean())
+            right_str = '{:.2f}'.format(right["Weighted " + mode].mean())
+            print(f'Market share for {mode}: {100*market_shares.shares[mode]:.2f}% ')
+            print(f'90% Confidence interval: [-{left_str}, +{right_str}]%')
+            print()
+    else:
+        # intervals from the robust covariance matrix of the estimates, in seconds
+        covariance = covariance_frame(run)
+        if args.intervals == 'delta':
+            intervals = share_intervals(MODEL3, df, betas, covariance, df['Weight'], level=0.9)
+        else:
+            intervals = simulation_intervals(MODEL3, df, betas, covariance, args.draws, df['Weight'], level=0.9)
+        for mode in ['WALK', 'BIKE', 'PT', 'CAR']:
+            print(f'Market share for {mode}: {100*market_shares.shares[mode]:.2f}% ')
+            print(f'90% Confidence interval: [{100*intervals.loc[mode, "Lower"]:.2f}, '
+                  f'{100*intervals.loc[mode, "Upper"]:.2f}]%')
+            print()
 
     ## Question 3: Actual Market Shares ##
     # We want to compute the weighted market share of each mode, by using the data
@@ -1,12 +1,20 @@
-import pandas as pd
 import biogeme.database as db
 import biogeme.biogeme as bio
 from biogeme import models
 from biogeme.expressions import Beta, Variable
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from lpmc.data import load_data
+from lpmc.memo import settings_hash
+from lpmc.specs import SPECS
+from lpmc.store import ResultStore, data_hash, spec_hash
+from lpmc.threads import estimation_threads
+from lpmc.warmstart import warm_start, report
 
 if __name__ == '__main__':
     # load the data
-    df = pd.read_csv('../data/lpmc01.dat', sep='\t')
+    df = load_data()
     database = db.Database('LPMC', df)
 
     # define the variables
@@ -39,9 +47,9 @@ if __name__ == '__main__':
     B_TIME_BIKE = Beta('B_TIME_BIKE', 0, None, None, 0)
     B_COST = Beta('B_COST', 0, None, None, 0)
 
-    # Auxiliary variables
-    COST_DRIVING = (COST_DRIVING_FUEL + COST_DRIVING_CCHARGE)
-    DUR_PT = DUR_PT_ACCESS + DUR_PT_RAIL + DUR_PT_BUS + DUR_PT_INT
+    # Derived attributes, precomputed in the data cache (see lpmc/features.py)
+    COST_DRIVING = Variable('cost_driving')
+    DUR_PT = Variable('dur_pt')
 
     # Definition of utility functions
     V_WALK = ASC_WALK + B_TIME_WALK * DUR_WALKING
@@ -58,15 +66,24 @@ if __name__ == '__main__':
     # The choice model is a logit, with availability conditions
     logprob = models.loglogit(V, av, TRAVEL_MODE)
 
-    # Create the Biogeme object
-    biogeme = bio.BIOGEME(database, logprob)
+    # Create the Biogeme object, with the number of threads tuned for this machine
+    threads = estimation_threads(database, logprob, 'model1')
+    biogeme = bio.BIOGEME(database, logprob, numberOfThreads=threads)
     biogeme.modelName = 'model1'
+    # the results are kept in the result store (see lpmc/store.py)
+    biogeme.generatePickle = False
 
     # Calculate the null log likelihood for reporting
     nullLogLikelihood = biogeme.calculateNullLoglikelihood(av)
 
+    # Start from the latest results of this model or of its parent
+    warm = warm_start(biogeme, 'model1', parents=['model0'])
+
     # Estimate the parameters
     results = biogeme.estimate()
+    report(warm, results)
+    ResultStore().add_biogeme('model1', spec_hash(SPECS['model1']), data_hash(), results,
+                              settings_hash=settings_hash('biogeme'), warm_start=warm is not None)
 
     # Get the results in a pandas table
     pandasResults = results.getEstimatedParameters()
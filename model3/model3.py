@@ -1,15 +1,28 @@
-import pandas as pd
 import biogeme.database as db
 import biogeme.biogeme as bio
 from biogeme import models
 from biogeme.expressions import Beta, Variable, log
 import biogeme.segmentation as seg
 import numpy as np
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from lpmc import profiling
+from lpmc.data import load_data
+from lpmc.memo import settings_hash
+from lpmc.specs import SPECS
+from lpmc.store import ResultStore, data_hash, spec_hash
+from lpmc.threads import estimation_threads
+from lpmc.warmstart import warm_start, report
 
 if __name__ == '__main__':
+    # time the phases of the run if LPMC_PROFILE names an output directory (see lpmc/profiling.py)
+    profiling.start('model3')
+
     # load the data
-    df = pd.read_csv('../data/lpmc01.dat', sep='\t')
-    database = db.Database('LPMC', df)
+    df = load_data()
+    with profiling.span('database'):
+        database = db.Database('LPMC', df)
 
     # define the variables
     TRAVEL_MODE = Variable('travel_mode')
@@ -45,12 +58,11 @@ if __name__ == '__main__':
     B_DRIVING_TRAFFIC_PERCENT = Beta('B_DRIVING_TRAFFIC_PERCENT', 0, None, None, 0)
     LAMBDA = Beta('LAMBDA', 1, None, None, 0)
 
-    # Auxiliary variables
-    COST_DRIVING = (COST_DRIVING_FUEL + COST_DRIVING_CCHARGE)
-    DUR_PT = DUR_PT_ACCESS + DUR_PT_RAIL + DUR_PT_BUS + DUR_PT_INT
+    # Derived attributes, precomputed in the data cache (see lpmc/features.py)
+    COST_DRIVING = Variable('cost_driving')
+    DUR_PT = Variable('dur_pt')
 
-    # Divide into age groups (0-16, 16-30, 30-60, 60+) and create dummy variables
-    df['age_group'] = pd.cut(df['age'], [0, 16, 30, 60, 1000], labels=[0, 1, 2, 3])
+    # Age groups (0-16, 16-30, 30-60, 60+), precomputed in the data cache
     AGE_GROUP = Variable('age_group')
     segmentation_age = seg.DiscreteSegmentationTuple(variable=AGE_GROUP, mapping={0: 'young', 1: 'young_adult', 2: 'adult', 3: 'senior'})
     segmented_B_TIME_WALK = seg.segment_parameter(B_TIME_WALK, [segmentation_age])
@@ -74,15 +86,28 @@ if __name__ == '__main__':
     # The choice model is a logit, with availability conditions
     logprob = models.loglogit(V, av, TRAVEL_MODE)
 
-    # Create the Biogeme object
-    biogeme = bio.BIOGEME(database, logprob, numberOfThreads=4)
+    # Create the Biogeme object, with the number of threads tuned for this machine
+    with profiling.span('tune threads'):
+        threads = estimation_threads(database, logprob, 'model3')
+    profiling.annotate(threads=threads)
+    with profiling.span('prepare expressions'):
+        biogeme = profiling.instrument_biogeme(bio.BIOGEME(database, logprob, numberOfThreads=threads))
     biogeme.modelName = 'model3'
+    # the results are kept in the result store (see lpmc/store.py)
+    biogeme.generatePickle = False
 
     # Calculate the null log likelihood for reporting
     nullLogLikelihood = biogeme.calculateNullLoglikelihood(av)
 
+    # Start from the latest results of this model or of its parent
+    warm = warm_start(biogeme, 'model3', parents=['model2'])
+
     # Estimate the parameters
-    results = biogeme.estimate()
+    with profiling.span('estimate'):
+        results = biogeme.estimate()
+    report(warm, results)
+    ResultStore().add_biogeme('model3', spec_hash(SPECS['model3']), data_hash(), results,
+                              settings_hash=settings_hash('biogeme'), warm_start=warm is not None)
 
     # Get the results in a pandas table
     pandasResults = results.getEstimatedParameters()
@@ -90,5 +115,6 @@ if __name__ == '__main__':
     print(pandasResults)
     print(f'Null log likelihood: {nullLogLikelihood}')
     print(f'Likelihood: {likelihood}')
+    profiling.finish()
 
     print(results.getLaTeX())
@@ -0,0 +1,49 @@
+import os
+
+import numpy as np
+import pytest
+
+from lpmc.data import load_data
+from lpmc.warmstart import ROOT, read_iter_file
+
+
+@pytest.fixture(scope='session')
+def df():
+    return load_data()
+
+
+@pytest.fixture(scope='session')
+def drivers(df):
+    """The LPMC trips, without the car trips of people with neither licence nor car."""
+    car = (df['driving_license'] > 0) | (df['car_ownership'] > 0)
+    return df[(df['travel_mode'] != 4) | car].reset_index(drop=True)
+
+
+def stored_betas(model):
+    """Parameters of the last biogeme iterate of ``model``."""
+    return read_iter_file(os.path.join(ROOT, model, f'__{model}.iter'))
+
+
+def finite_gradient(f, beta, step=1e-6):
+    """Central differences of a scalar function."""
+    grad = np.empty(len(beta))
+    for k in range(len(beta)):
+        h = step * max(1.0, abs(beta[k]))
+        up, down = beta.copy(), beta.copy()
+        up[k] += h
+        down[k] -= h
+        grad[k] = (f(up) - f(down)) / (2 * h)
+    return grad
+
+
+def perturbed(model, start, scale=0.05, seed=0):
+    """Starting values of ``model`` from the stored iterate of ``start``, with noise."""
+    beta = model.start_values(stored_betas(start))
+    return beta + np.random.default_rng(seed).normal(scale=scale, size=len(beta))
+
+
+def check_gradient(model, beta):
+    """The analytic gradient of ``model`` matches central differences of its log likelihood."""
+    ll, grad = model.loglike_and_gradient(beta)
+    assert ll == pytest.approx(model.loglike(beta))
+    np.testing.assert_allclose(grad, finite_gradient(model.loglike, beta), rtol=1e-5, atol=1e-4)
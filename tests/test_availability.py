@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from lpmc.engine import choice_probabilities, model_for
+from lpmc.features import add_derived, available_alternatives
+from lpmc.mnl import MNL, design_tensor
+from lpmc.scenarios import Scenario, simulate
+from lpmc.specs import MODEL2
+from lpmc.streaming import ChunkedModel
+
+from conftest import check_gradient, perturbed, stored_betas
+
+MASKED = MODEL2._replace(availability='availability_driver')
+
+
+def test_masks(df):
+    route = available_alternatives(df['availability'], [1, 2, 3, 4])
+    assert (~route).sum(axis=0).tolist() == [0, 0, 7, 0]
+    driver = available_alternatives(df['availability_driver'], [1, 2, 3, 4])
+    assert (route & ~driver)[:, [0, 1, 2]].sum() == 0
+    assert ((df['travel_mode'] == 4) & ~driver[:, 3]).sum() == 85
+    with pytest.raises(ValueError, match='85 observations'):
+        model_for(MASKED, df)
+
+
+def test_gradient(drivers):
+    model = model_for(MASKED, drivers)
+    assert type(model) is MNL
+    check_gradient(model, perturbed(model, 'model2'))
+
+
+def test_probabilities(drivers):
+    betas = stored_betas('model2')
+    V = MASKED.utility_matrix(drivers, betas)
+    available = available_alternatives(drivers['availability_driver'], [1, 2, 3, 4])
+    assert np.isneginf(V[~available]).all()
+    P = choice_probabilities(MASKED, V, betas)
+    assert (P[~available] == 0).all()
+    model = model_for(MASKED, drivers)
+    np.testing.assert_allclose(model.probabilities(model.start_values(betas)), P)
+
+
+def test_scenarios(drivers):
+    betas = stored_betas('model2')
+    scenarios = [Scenario('car +15%', {'cost_driving': 1.15}),
+                 Scenario('no rail', {'dur_pt_rail': 0.0}),
+                 Scenario('no car', {'dur_driving': 0.0})]
+    shares = simulate(MASKED, drivers, betas, scenarios)
+    for scenario in scenarios:
+        # the whole sample with the derived columns recomputed from scratch
+        data = drivers.drop(columns=['dur_pt', 'availability_driver'])
+        for col in scenario.transforms:
+            data[col] = scenario.apply(drivers, col)
+        add_derived(data, ['dur_pt', 'availability_driver'])
+        P = choice_probabilities(MASKED, MASKED.utility_matrix(data, betas), betas)
+        np.testing.assert_allclose(shares.loc[scenario.name].to_numpy(), P.mean(axis=0), rtol=1e-6)
+    assert shares.loc['no car', 'CAR'] == 0
+
+
+def test_null_loglike(df, drivers):
+    for spec, data in [(MASKED, drivers), (MODEL2._replace(availability='availability'), df)]:
+        model = model_for(spec, data)
+        # with all the parameters at 0 the utilities are equal
+        assert model.null_loglike() == pytest.approx(model.loglike(np.zeros(len(model.beta_names))))
+    assert model.null_loglike() > -len(df) * np.log(4)
+    chunked = ChunkedModel(spec, chunk_size=1000)
+    chunked.evaluate(chunked.start_values())
+    assert chunked.null_loglike == pytest.approx(model.null_loglike())
+
+
+def test_pattern_tensors(drivers):
+    model = model_for(MASKED, drivers)
+    full = design_tensor(MODEL2, drivers, model.beta_names)
+    # one row of parameters per available alternative
+    assert sum(X.size for _, _, X, _ in model.groups) == model.available.sum() * full.shape[2]
+    V, dV = model.utilities(np.ones(len(model.beta_names)))
+    np.testing.assert_array_equal(dV[model.available], full[model.available])
+    assert (dV[~model.available] == 0).all()
+
+
+def test_nested_gradient(drivers):
+    # a linear nested spec evaluates the utilities of the masked MNL
+    spec = MASKED._replace(nests=(('mu', [3, 4]), (1.0, [1, 2])))
+    model = model_for(spec, drivers)
+    check_gradient(model, perturbed(model, 'model2') + (np.array(model.beta_names) == 'mu'))
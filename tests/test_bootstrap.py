@@ -0,0 +1,41 @@
+import csv
+
+import numpy as np
+import pytest
+
+from lpmc.bootstrap import bootstrap, draw_weights, mnl_estimator
+from lpmc.engine import model_for
+from lpmc.specs import MODEL0
+
+ROWS = 500
+
+
+@pytest.fixture(scope='module')
+def model(df):
+    return model_for(MODEL0, df.iloc[:ROWS].reset_index(drop=True))
+
+
+@pytest.mark.parametrize('method', ['resample', 'bayesian'])
+def test_weights(method):
+    weights = draw_weights(100, 5, method, seed=3)
+    assert weights.shape == (5, 100)
+    np.testing.assert_allclose(weights.sum(axis=1), 100, rtol=1e-5)
+    # adding replications keeps the earlier ones
+    np.testing.assert_array_equal(draw_weights(100, 8, method, seed=3)[:5], weights)
+
+
+def test_resume(model, tmp_path):
+    start = model.estimate(covariance=False).get_beta_values()
+    first = bootstrap(mnl_estimator(model), ROWS, 4, start, tmp_path, workers=2)
+    assert len(first) == 4 and first[0] != start
+    # drop the last finished replication, as if the run had been interrupted
+    with open(tmp_path / 'replications.csv') as f:
+        rows = list(csv.reader(f))
+    with open(tmp_path / 'replications.csv', 'w', newline='') as f:
+        csv.writer(f).writerows(rows[:-1])
+    resumed = bootstrap(mnl_estimator(model), ROWS, 6, start, tmp_path, workers=2)
+    assert len(resumed) == 6
+    for a, b in zip(first, resumed):
+        assert a == pytest.approx(b, rel=1e-6)
+    with open(tmp_path / 'replications.csv') as f:
+        assert len(list(csv.reader(f))) == 7
@@ -0,0 +1,33 @@
+import numpy as np
+
+from lpmc.boxcox import BoxCoxColumns, BoxCoxMNL
+from lpmc.engine import model_for
+from lpmc.specs import MODEL3, boxcox
+
+from conftest import check_gradient, perturbed
+
+
+def test_engine(df):
+    assert type(model_for(MODEL3, df)) is BoxCoxMNL
+
+
+def test_gradient(df):
+    model = model_for(MODEL3, df)
+    check_gradient(model, perturbed(model, 'model3'))
+
+
+def test_small_lambda(df):
+    model = model_for(MODEL3, df)
+    beta = perturbed(model, 'model3')
+    beta[model.beta_names.index('LAMBDA')] = 1e-7
+    check_gradient(model, beta)
+
+
+def test_columns_cache():
+    x = np.array([0.0, 0.5, 1.0, 2.0])
+    columns = BoxCoxColumns({'x': x}, cache_size=2)
+    for ell in [0.3, 0.3, 0.5, 0.3, 0.7, 0.5]:
+        y, _ = columns.get(ell)['x']
+        np.testing.assert_allclose(y, boxcox(x, ell))
+    assert (columns.hits, columns.misses) == (2, 4)
+    assert list(columns.cache) == [0.7, 0.5]
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from lpmc.compress import compress
+from lpmc.engine import model_for
+from lpmc.specs import MODEL3_MIXED, SPECS
+
+from conftest import stored_betas
+
+
+@pytest.mark.parametrize('model', sorted(SPECS))
+def test_compressed_loglike(df, model):
+    spec = SPECS[model]
+    weights = np.random.default_rng(0).uniform(0.5, 2.0, len(df))
+    full = model_for(spec, df, weights)
+    compressed = model_for(spec, df, weights, compress=True)
+    assert compressed.n_obs < full.n_obs
+    assert compressed.sample_size == full.n_obs
+    beta = full.start_values(stored_betas(model))
+    ll, grad = compressed.loglike_and_gradient(beta)
+    ll_full, grad_full = full.loglike_and_gradient(beta)
+    assert ll == pytest.approx(ll_full, rel=1e-10)
+    np.testing.assert_allclose(grad, grad_full, rtol=1e-8, atol=1e-8)
+
+
+def test_estimates(df):
+    spec = SPECS['model2']
+    full = model_for(spec, df).estimate()
+    compressed = model_for(spec, df, compress=True).estimate()
+    assert compressed.loglike == pytest.approx(full.loglike, abs=1e-6)
+    assert compressed.bic == pytest.approx(full.bic, abs=1e-5)
+    assert compressed.null_loglike == pytest.approx(full.null_loglike)
+    np.testing.assert_allclose(compressed.values, full.values, rtol=1e-5, atol=1e-6)
+    np.testing.assert_allclose(compressed.robust_covariance, full.robust_covariance, rtol=1e-4, atol=1e-10)
+
+
+def test_mixed_not_compressed(df):
+    with pytest.raises(ValueError, match='random coefficients'):
+        compress(MODEL3_MIXED, df)
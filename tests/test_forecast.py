@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from lpmc.data import iter_chunks
+from lpmc.engine import choice_probabilities
+from lpmc.forecast import forecast
+from lpmc.specs import MODEL3, MODEL4
+
+from conftest import stored_betas
+
+
+@pytest.mark.parametrize('spec, start', [(MODEL3, 'model3'), (MODEL4, 'model4')], ids=['boxcox', 'nested'])
+def test_chunks_and_segments(df, spec, start):
+    betas = stored_betas(start)
+    segments = ['age_group', 'female']
+    streamed = forecast(spec, betas, iter_chunks(chunk_size=700), weight='car_ownership', segments=segments)
+    P = pd.DataFrame(choice_probabilities(spec, spec.utility_matrix(df, betas), betas), columns=streamed.names)
+    w = df['car_ownership'].to_numpy(dtype=float)
+    assert streamed.n_obs == len(df)
+    np.testing.assert_allclose(streamed.shares, w @ P.to_numpy() / w.sum(), rtol=1e-10)
+    weighted = P.mul(w, axis=0).groupby([df[col] for col in segments]).sum()
+    expected = weighted.div(pd.Series(w).groupby([df[col] for col in segments]).sum(), axis=0)
+    shares = streamed.segment_shares
+    assert list(shares.index.names) == segments
+    np.testing.assert_allclose(shares.to_numpy(), expected.loc[shares.index].to_numpy(), rtol=1e-10)
+    assert len(shares) == len(expected.dropna())
+
+
+def test_single_frame(df):
+    betas = stored_betas('model3')
+    np.testing.assert_allclose(forecast(MODEL3, betas, df).shares,
+                               forecast(MODEL3, betas, iter_chunks(chunk_size=999)).shares, rtol=1e-10)
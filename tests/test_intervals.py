@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from lpmc.engine import choice_probabilities, model_for
+from lpmc.intervals import draw_parameters, numerical_jacobian, share_jacobian, simulate_shares
+from lpmc.specs import MODEL2, MODEL3
+
+from conftest import stored_betas
+
+MASKED = MODEL2._replace(availability='availability_driver')
+
+
+def shares_at(spec, data, betas):
+    return choice_probabilities(spec, spec.utility_matrix(data, betas), betas).mean(axis=0)
+
+
+@pytest.mark.parametrize('spec, start, sample', [
+    (MODEL3, 'model3', 'df'),
+    (MASKED, 'model2', 'drivers'),
+], ids=['boxcox', 'availability'])
+def test_share_jacobian(request, spec, start, sample):
+    data = request.getfixturevalue(sample)
+    betas = stored_betas(start)
+    names = spec.beta_names()
+    shares, J = share_jacobian(spec, data, betas, names)
+
+    def at(values):
+        return shares_at(spec, data, dict(betas, **dict(zip(names, values))))
+
+    beta = np.array([betas[name] for name in names])
+    np.testing.assert_allclose(shares, at(beta), rtol=1e-10)
+    np.testing.assert_allclose(J, numerical_jacobian(at, beta), rtol=1e-5, atol=1e-7)
+
+
+@pytest.mark.parametrize('spec', [MODEL2, MASKED], ids=['mnl', 'availability'])
+def test_simulated_shares(drivers, spec):
+    results = model_for(spec, drivers).estimate()
+    betas = results.get_beta_values()
+    covariance = pd.DataFrame(results.robust_covariance, index=results.names, columns=results.names)
+    shares = simulate_shares(spec, drivers, betas, covariance, n_draws=50, seed=1)
+    # the batched products of the linear specs against one evaluation per draw
+    draws = draw_parameters(betas, covariance, 50, seed=1)
+    expected = [shares_at(spec, drivers, dict(betas, **draw)) for _, draw in draws.iterrows()]
+    np.testing.assert_allclose(shares, expected, rtol=1e-10)
+    np.testing.assert_allclose(shares.mean(axis=0), shares_at(spec, drivers, betas), atol=0.01)
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from lpmc import memo
+from lpmc.specs import MODEL0, MODEL2
+from lpmc.store import ResultStore, spec_hash
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultStore(str(tmp_path / 'results.sqlite'))
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def estimations(monkeypatch):
+    calls = []
+    estimate = memo._estimate_numpy
+
+    def counted(spec, df, settings):
+        calls.append(spec.name)
+        return estimate(spec, df, settings)
+
+    monkeypatch.setattr(memo, '_estimate_numpy', counted)
+    return calls
+
+
+def test_cache_hits(df, store, estimations):
+    first = memo.estimate(MODEL0, df, store=store)
+    second = memo.estimate(MODEL0, df, store=store)
+    assert estimations == ['model0'] and second.id == first.id
+    np.testing.assert_array_equal(second.values, first.values)
+    assert second.robust_covariance is not None
+    # other settings, another spec and a refresh all estimate again
+    memo.estimate(MODEL0, df, store=store, settings={'tol': 1e-6})
+    memo.estimate(MODEL2, df, store=store)
+    refreshed = memo.estimate(MODEL0, df, store=store, refresh=True)
+    assert estimations == ['model0', 'model0', 'model2', 'model0']
+    assert memo.estimate(MODEL0, df, store=store).id == refreshed.id
+    assert first.warm_start == 0
+
+
+def test_hashes():
+    assert spec_hash(MODEL2) != spec_hash(MODEL2._replace(availability='availability'))
+    assert spec_hash(MODEL2) == spec_hash(MODEL2._replace(name='renamed'))
+    assert memo.settings_hash('numpy') != memo.settings_hash('numpy', {'tol': 1e-6})
+    assert memo.settings_hash('numpy') != memo.settings_hash('biogeme')
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from lpmc.mixed import MixedLogit, draws, start_from_fixed
+from lpmc.specs import MODEL3_MIXED
+
+from conftest import check_gradient, stored_betas
+
+ROWS = 500
+
+
+@pytest.fixture(scope='module')
+def model(df):
+    return MixedLogit(MODEL3_MIXED, df.iloc[:ROWS].reset_index(drop=True), n_draws=20, workers=1)
+
+
+def test_gradient(model):
+    check_gradient(model, model.start_values(start_from_fixed(MODEL3_MIXED, stored_betas('model3'))))
+
+
+def test_probabilities(model):
+    beta = model.start_values(start_from_fixed(MODEL3_MIXED, stored_betas('model3')))
+    P = model.probabilities(beta)
+    np.testing.assert_allclose(P.sum(axis=1), 1.0)
+
+
+def test_draws_reused(tmp_path):
+    first = draws(10, 8, 2, 'halton', seed=1, directory=tmp_path)
+    second = draws(10, 8, 2, 'halton', seed=1, directory=tmp_path)
+    assert first.shape == (10, 8, 2) and first.dtype == np.float32
+    np.testing.assert_array_equal(first, second)
+    assert len(list(tmp_path.iterdir())) == 1
@@ -0,0 +1,31 @@
+import numpy as np
+
+from lpmc.engine import model_for
+from lpmc.mnl import LogitModel, MNL
+from lpmc.specs import MODEL0, MODEL2
+
+from conftest import check_gradient, perturbed, stored_betas
+
+
+def test_engine(df):
+    assert type(model_for(MODEL2, df)) is MNL
+
+
+def test_gradient(df):
+    model = model_for(MODEL2, df)
+    check_gradient(model, perturbed(model, 'model2'))
+
+
+def test_weighted_gradient(df):
+    weights = np.random.default_rng(1).uniform(0.5, 2.0, len(df))
+    model = model_for(MODEL0, df, weights)
+    check_gradient(model, perturbed(model, 'model0'))
+
+
+def test_hessian(df):
+    model = model_for(MODEL2, df)
+    assert model.analytic_hessian
+    beta = model.start_values(stored_betas('model2'))
+    # finite differences of the analytic gradient
+    numerical = LogitModel.hessian(model, beta)
+    np.testing.assert_allclose(model.hessian(beta), numerical, rtol=1e-5, atol=1e-3)
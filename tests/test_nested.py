@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from lpmc.engine import choice_probabilities, model_for
+from lpmc.nested import NestedLogit
+from lpmc.specs import MODEL3, MODEL4
+
+from conftest import check_gradient, perturbed, stored_betas
+
+# motorized and non-motorized nests, the car sharing both
+MODEL4_CROSS = MODEL4._replace(name='model4_cross', nests=(
+    ('mu', {3: 1.0, 4: 0.6}),
+    (1.0, {1: 1.0, 2: 1.0, 4: 0.4}),
+))
+
+
+@pytest.mark.parametrize('spec', [MODEL4, MODEL4_CROSS], ids=['nested', 'cross-nested'])
+def test_gradient(df, spec):
+    model = model_for(spec, df)
+    assert type(model) is NestedLogit
+    check_gradient(model, perturbed(model, 'model4'))
+
+
+def test_unit_scale_is_logit(df):
+    betas = dict(stored_betas('model3'), mu=1.0)
+    V = MODEL3.utility_matrix(df, betas)
+    np.testing.assert_allclose(choice_probabilities(MODEL4, V, betas), choice_probabilities(MODEL3, V, betas))
+    nested, logit = model_for(MODEL4, df), model_for(MODEL3, df)
+    assert nested.loglike(nested.start_values(betas)) == pytest.approx(logit.loglike(logit.start_values(betas)))
+
+
+@pytest.mark.parametrize('spec', [MODEL4, MODEL4_CROSS], ids=['nested', 'cross-nested'])
+def test_probabilities(df, spec):
+    model = model_for(spec, df)
+    beta = perturbed(model, 'model4')
+    P = model.probabilities(beta)
+    np.testing.assert_allclose(P.sum(axis=1), 1.0)
+    ll = model.weights @ np.log(P[np.arange(model.n_obs), model.chosen])
+    assert ll == pytest.approx(model.loglike(beta))
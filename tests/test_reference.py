@@ -0,0 +1,29 @@
+import pytest
+
+from lpmc.engine import model_for
+from lpmc.specs import SPECS
+
+from conftest import stored_betas
+
+# final log likelihoods of the biogeme reports (modelN/modelN.html)
+REFERENCE = {
+    'model0': -4541.563,
+    'model1': -4200.663,
+    'model2': -4048.093,
+    'model3': -3999.125,
+    'model4': -3996.133,
+}
+
+
+@pytest.mark.parametrize('model', sorted(REFERENCE))
+def test_stored_loglike(df, model):
+    m = model_for(SPECS[model], df)
+    assert m.loglike(m.start_values(stored_betas(model))) == pytest.approx(REFERENCE[model], abs=1e-3)
+
+
+@pytest.mark.parametrize('model', ['model0', 'model2'])
+def test_estimate_matches_biogeme(df, model):
+    results = model_for(SPECS[model], df).estimate(covariance=False)
+    assert results.loglike == pytest.approx(REFERENCE[model], abs=1e-3)
+    for name, value in stored_betas(model).items():
+        assert results.get_beta_values()[name] == pytest.approx(value, rel=1e-3, abs=1e-4)
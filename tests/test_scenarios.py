@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from lpmc.engine import choice_probabilities
+from lpmc.features import add_derived
+from lpmc.scenarios import Scenario, simulate, sweep
+from lpmc.specs import MODEL2, MODEL3, MODEL4
+
+from conftest import stored_betas
+
+DERIVED = ['cost_driving', 'dur_pt', 'age_group']
+
+
+def recomputed(spec, df, betas, scenario, weights=None):
+    """Shares of a scenario applied to a copy of the data, all the derived columns recomputed."""
+    data = df.drop(columns=DERIVED)
+    for col in scenario.transforms:
+        data[col] = scenario.apply(df, col)
+    add_derived(data, DERIVED)
+    w = np.ones(len(df)) if weights is None else weights
+    return w @ choice_probabilities(spec, spec.utility_matrix(data, betas), betas) / w.sum()
+
+
+@pytest.mark.parametrize('spec, start', [(MODEL2, 'model2'), (MODEL3, 'model3'), (MODEL4, 'model4')],
+                         ids=['mnl', 'boxcox', 'nested'])
+def test_against_recomputation(df, spec, start):
+    betas = stored_betas(start)
+    weights = np.random.default_rng(0).uniform(0.5, 2.0, len(df))
+    scenarios = [Scenario('PT -15%', {'cost_transit': 0.85}),
+                 Scenario('car +15%', {'cost_driving': 1.15}),
+                 Scenario('charge x3', {'cost_driving_ccharge': 3.0}),
+                 Scenario('slow bus', {'dur_pt_bus': lambda x: x + 0.1}),
+                 Scenario('older', {'age': lambda x: x + 20})]
+    shares = simulate(spec, df, betas, scenarios, weights)
+    assert list(shares.index) == ['base'] + [scenario.name for scenario in scenarios]
+    np.testing.assert_allclose(shares.to_numpy().sum(axis=1), 1.0)
+    base = weights @ choice_probabilities(spec, spec.utility_matrix(df, betas), betas) / weights.sum()
+    np.testing.assert_allclose(shares.loc['base'], base, rtol=1e-12)
+    for scenario in scenarios:
+        np.testing.assert_allclose(shares.loc[scenario.name], recomputed(spec, df, betas, scenario, weights),
+                                   rtol=1e-10)
+        assert not np.allclose(shares.loc[scenario.name], base)
+
+
+def test_errors(df):
+    betas = stored_betas('model2')
+    with pytest.raises(ValueError, match="uses neither \\['purpose'\\]"):
+        simulate(MODEL2, df, betas, [Scenario('purpose', {'purpose': 2.0})])
+    with pytest.raises(ValueError, match='cannot be recomputed'):
+        simulate(MODEL2, df[MODEL2.columns() + ['cost_driving_fuel']], betas,
+                 [Scenario('fuel', {'cost_driving_fuel': 2.0})])
+    with pytest.raises(ValueError, match='missing from the data'):
+        simulate(MODEL2, df[MODEL2.columns()], betas, [Scenario('charge', {'cost_driving_ccharge': 2.0})])
+
+
+def test_sweep():
+    scenarios = sweep('cost_transit', [0.5, 1.25], label='PT fare')
+    assert [scenario.name for scenario in scenarios] == ['PT fare x0.5', 'PT fare x1.25']
+    assert scenarios[1].transforms == {'cost_transit': 1.25}
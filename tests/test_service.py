@@ -0,0 +1,87 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import numpy as np
+import pytest
+
+from lpmc.engine import choice_probabilities
+from lpmc.service import Service, serve
+from lpmc.specs import MODEL3
+
+from conftest import stored_betas
+
+RAW = ['dur_walking', 'dur_cycling', 'dur_pt_access', 'dur_pt_rail', 'dur_pt_bus', 'dur_pt_int', 'dur_driving',
+       'cost_transit', 'cost_driving_fuel', 'cost_driving_ccharge', 'driving_traffic_percent', 'age']
+
+
+@pytest.fixture(scope='module')
+def server(df):
+    service = Service({'model3': stored_betas('model3')}, df)
+    server = serve(service, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    service.batcher.close()
+
+
+def post(server, path, body):
+    url = f'http://127.0.0.1:{server.server_address[1]}{path}'
+    request = urllib.request.Request(url, json.dumps(body).encode())
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_predict(df, server):
+    trips = df[RAW].iloc[:20].to_dict(orient='records')
+    status, content = post(server, '/predict', {'model': 'model3', 'trips': trips})
+    assert status == 200
+    betas = stored_betas('model3')
+    P = choice_probabilities(MODEL3, MODEL3.utility_matrix(df.iloc[:20], betas), betas)
+    np.testing.assert_allclose(content['probabilities'], P, rtol=1e-5)
+
+
+def test_concurrent_batches(df, server):
+    trips = [df[RAW].iloc[i:i + 5].to_dict(orient='records') for i in range(0, 100, 5)]
+    results = [None] * len(trips)
+
+    def run(i):
+        results[i] = post(server, '/predict', {'model': 'model3', 'trips': trips[i]})
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(trips))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    P = np.concatenate([content['probabilities'] for _, content in results])
+    betas = stored_betas('model3')
+    np.testing.assert_allclose(P, choice_probabilities(MODEL3, MODEL3.utility_matrix(df.iloc[:100], betas), betas),
+                               rtol=1e-5)
+
+
+def test_scenarios(df, server):
+    body = {'model': 'model3', 'scenarios': [{'name': 'charge', 'transforms': {'cost_driving_ccharge': 3}}]}
+    status, content = post(server, '/scenarios', body)
+    assert status == 200
+    assert content['shares']['charge']['CAR'] < content['shares']['base']['CAR']
+    status, content = post(server, '/scenarios', dict(body, trips=df[RAW].iloc[:50].to_dict(orient='records')))
+    assert status == 200 and content['shares']['charge']['CAR'] < content['shares']['base']['CAR']
+
+
+def test_errors(df, server, monkeypatch):
+    assert post(server, '/predict', {'model': 'model9', 'trips': []})[0] == 400
+    status, content = post(server, '/predict', {'model': 'model3', 'trips': [{'dur_walking': 1.0}]})
+    assert status == 400 and 'Missing columns' in content['error']
+    assert post(server, '/forecast', {})[0] == 404
+
+    def fail(*args):
+        raise RuntimeError('engine failure')
+
+    monkeypatch.setattr('lpmc.service.choice_probabilities', fail)
+    status, content = post(server, '/predict', {'model': 'model3', 'trips': df[RAW].iloc[:2].to_dict(orient='records')})
+    assert status == 500 and content['error'] == 'RuntimeError: engine failure'
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from lpmc import streaming
+from lpmc.engine import model_for
+from lpmc.specs import MODEL2, MODEL3, MODEL4
+from lpmc.streaming import ChunkedModel
+
+
+@pytest.mark.parametrize('spec', [MODEL2, MODEL3], ids=['mnl', 'boxcox'])
+def test_matches_in_memory(df, spec):
+    streamed = ChunkedModel(spec, chunk_size=1000).estimate()
+    full = model_for(spec, df).estimate(covariance=False)
+    assert streamed.loglike == pytest.approx(full.loglike, abs=1e-4)
+    assert streamed.null_loglike == pytest.approx(full.null_loglike)
+    np.testing.assert_allclose(streamed.values, full.values, rtol=1e-3, atol=1e-4)
+
+
+def test_bounds(df):
+    # the bound is active at the optimum: the unbounded scale is about 1.32
+    spec = MODEL4._replace(bounds={'mu': (1.5, 10)})
+    streamed = ChunkedModel(spec, chunk_size=1000).estimate()
+    full = model_for(spec, df).estimate(covariance=False)
+    assert streamed.get_beta_values()['mu'] == 1.5
+    assert streamed.loglike == pytest.approx(full.loglike, abs=1e-4)
+
+
+def test_reads_spec_columns(monkeypatch):
+    read, original = [], streaming.iter_chunks
+
+    def iter_chunks(path, columns=None, chunk_size=None):
+        read.append(columns)
+        return original(path, columns=columns, chunk_size=chunk_size)
+
+    monkeypatch.setattr(streaming, 'iter_chunks', iter_chunks)
+    model = ChunkedModel(MODEL2, chunk_size=1000, weight='female')
+    model.evaluate(model.start_values())
+    assert read and all(columns == MODEL2.columns() + ['female'] for columns in read)
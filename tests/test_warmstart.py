@@ -0,0 +1,62 @@
+import sqlite3
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from lpmc.mnl import Estimates
+from lpmc.specs import SPECS
+from lpmc.store import SCHEMA, ResultStore, data_hash, spec_hash
+from lpmc.warmstart import cold_start_iterations, inherit, report, starting_values, stored_run
+
+
+def estimates(value, iterations):
+    return Estimates(['ASC_CAR', 'B_TIME'], [value, -1.0], -100.0, -200.0, 50, None, None,
+                     iterations=iterations)
+
+
+@pytest.fixture
+def root(tmp_path):
+    store = ResultStore(str(tmp_path / 'results.sqlite'))
+    current = spec_hash(SPECS['model0']), data_hash()
+    store.add_estimates('model0', *current, estimates(1.0, 30), warm_start=False)
+    store.add_estimates('model0', *current, estimates(2.0, 12), warm_start=True)
+    # newer, but for another version of the data
+    store.add_estimates('model0', current[0], 'other', estimates(3.0, 5), warm_start=True)
+    store.close()
+    return str(tmp_path)
+
+
+def test_inherit():
+    assert inherit(['B_TIME_CAR', 'B_TIME_WALK_adult', 'ASC_PT'], {'B_TIME': -1.0, 'B_TIME_WALK': -2.0}) == {
+        'B_TIME_CAR': -1.0, 'B_TIME_WALK_adult': -2.0}
+
+
+def test_prefers_current_spec_and_data(root):
+    assert stored_run('model0', root).values[0] == 2.0
+    assert stored_run('model1', root) is None
+
+
+def test_cold_start_baseline(root, capsys):
+    assert cold_start_iterations('model0', root) == 30
+    start, info = starting_values(['ASC_CAR', 'B_TIME'], 'model0', root=root)
+    assert start == {'ASC_CAR': 2.0, 'B_TIME': -1.0}
+    assert info['iterations'] == 12 and info['cold_start_iterations'] == 30
+    results = SimpleNamespace(data=SimpleNamespace(optimizationMessages={'Number of iterations': 8}))
+    report(info, results)
+    assert 'last cold start: 30, saved: 22' in capsys.readouterr().out
+    report(dict(info, cold_start_iterations=None), results)
+    assert 'no cold start' in capsys.readouterr().out
+
+
+def test_migration(tmp_path):
+    path = str(tmp_path / 'old.sqlite')
+    connection = sqlite3.connect(path)
+    connection.executescript(SCHEMA.replace('    settings_hash TEXT,\n', '').replace('    warm_start INTEGER,\n', ''))
+    connection.close()
+    store = ResultStore(path)
+    store.add_estimates('model0', 'spec', 'data', estimates(1.0, 3), warm_start=False)
+    run = store.latest('model0', warm_start=False)
+    assert run.warm_start == 0 and np.allclose(run.values, [1.0, -1.0])
+    assert store.latest('model0', warm_start=True) is None
+    store.close()
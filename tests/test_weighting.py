@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from lpmc.weighting import cell_table, cell_weights, rake
+
+
+@pytest.fixture
+def sample():
+    return pd.DataFrame({'old': [0, 0, 0, 1, 1, 0, 1, 0], 'female': [0, 1, 1, 0, 1, 1, 0, 0]})
+
+
+def test_cell_weights(sample):
+    cells = pd.DataFrame({'old': [0, 0, 1, 1], 'female': [0, 1, 0, 1], 'population': [30, 20, 40, 10]})
+    w = cell_weights(sample, cells, ['old', 'female'])
+    assert w.sum() == pytest.approx(len(sample))
+    shares = pd.Series(w).groupby([sample['old'], sample['female']]).sum() / len(sample)
+    np.testing.assert_allclose(shares.to_numpy(), [0.3, 0.2, 0.4, 0.1])
+    with pytest.raises(ValueError, match='match no census cell'):
+        cell_table(sample, cells.iloc[:3], ['old', 'female'])
+    with pytest.raises(ValueError, match='No observation in the census cells'):
+        cell_table(sample.iloc[:3], cells, ['old', 'female'])
+
+
+def test_rake(sample):
+    marginals = {'old': pd.Series({0: 60, 1: 40}), 'female': pd.Series({0: 45, 1: 55})}
+    w = rake(sample, marginals)
+    assert w.sum() == pytest.approx(len(sample))
+    for column, totals in marginals.items():
+        margins = pd.Series(w).groupby(sample[column]).sum()
+        np.testing.assert_allclose(margins.to_numpy(), totals.to_numpy() * len(sample) / totals.sum(), rtol=1e-9)
+
+
+def test_rake_empty_category(sample):
+    with pytest.raises(ValueError, match=r'No observation in the categories \[2\] of old'):
+        rake(sample, {'old': pd.Series({1: 3, 0: 5, 2: 1})})
+    # a category with no population and no observation is fine
+    w = rake(sample, {'old': pd.Series({1: 3, 0: 5, 2: 0})})
+    assert pd.Series(w).groupby(sample['old']).sum().to_dict() == pytest.approx({0: 5.0, 1: 3.0})